@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Content-addressed storage for workflow PDFs.
+
+workflows.pdf_data kept every PDF inline, so scans, backups and every sync
+of workflows.db carried the PDF bytes. The migration here moves them into
+a blob store keyed by sha256 and leaves workflows.pdf_sha256 (and
+pdf_size) as the reference; pdf_data is emptied rather than dropped, so
+writers that still insert inline PDFs keep working and are picked up by
+the next run. Identical PDFs are stored once.
+
+The server app still reads workflows.pdf_data and can't reach a local
+blob store, so the migration refuses to run on the synced database
+(local_workflows.db, or the server's workflows.db): the next upload would
+replace every PDF on the server with an empty one. Run it on a copy, or
+pass --allow-synced once the app reads pdf_sha256 from a store it can reach.
+
+Stores:
+- FileBlobStore: one file per blob under a directory (ab/cd/<sha256>)
+- SQLiteBlobStore: a separate SQLite file, outside the synced database
+
+Both stream: blobs are hashed and written in chunks and open() returns a
+file object that reads lazily.
+
+    python blob_store.py migrate ./workflows_archive.db --store ./workflow_blobs
+    python blob_store.py cat ./local_workflows.db 42 --store ./workflow_blobs > workflow.pdf
+    python blob_store.py gc ./local_workflows.db --store ./workflow_blobs
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from typing import BinaryIO, Iterable, Set, Tuple, Union
+
+from sqlite_dal import record_migration
+
+CHUNK_SIZE = 1024 * 1024
+MIGRATION_NAME = "move_pdf_data_to_blob_store"
+# The local copy tunneldb.py syncs and the server's file it syncs with
+SYNCED_DB_NAMES = ("local_workflows.db", "workflows.db")
+
+Source = Union[bytes, BinaryIO]
+
+
+def _chunks(source: Source) -> Iterable[bytes]:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), CHUNK_SIZE):
+            yield view[start:start + CHUNK_SIZE]
+        return
+    yield from iter(lambda: source.read(CHUNK_SIZE), b"")
+
+
+def _spool(source: Source) -> Tuple[str, int, BinaryIO]:
+    """Hash source while copying it to a temp file; returns (sha256, size, rewound file)"""
+    digest = hashlib.sha256()
+    size = 0
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * CHUNK_SIZE)
+    for chunk in _chunks(source):
+        digest.update(chunk)
+        spool.write(chunk)
+        size += len(chunk)
+    spool.seek(0)
+    return digest.hexdigest(), size, spool
+
+
+class FileBlobStore:
+    """Blobs as files under root, sharded by the first bytes of their hash"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self._path(sha256))
+
+    def put(self, source: Source) -> Tuple[str, int]:
+        """Store source (bytes or a binary file); returns (sha256, size)"""
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".incoming-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for chunk in _chunks(source):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            sha256 = digest.hexdigest()
+            path = self._path(sha256)
+            if os.path.exists(path):
+                os.remove(tmp_path)  # already stored
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, sha256: str) -> BinaryIO:
+        return open(self._path(sha256), "rb")
+
+    def delete(self, sha256: str):
+        if self.exists(sha256):
+            os.remove(self._path(sha256))
+
+    def hashes(self) -> Set[str]:
+        found = set()
+        for _, _, files in os.walk(self.root):
+            found.update(name for name in files if not name.startswith(".incoming-"))
+        return found
+
+
+class SQLiteBlobStore:
+    """Blobs in their own SQLite file, read and written incrementally with blobopen"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def exists(self, sha256: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone() is not None
+
+    def put(self, source: Source) -> Tuple[str, int]:
+        """Store source (bytes or a binary file); returns (sha256, size)"""
+        sha256, size, spool = _spool(source)
+        with spool:
+            if self.exists(sha256):
+                return sha256, size
+            with self.conn:
+                cursor = self.conn.execute("INSERT INTO blobs (sha256, size, data) VALUES (?, ?, zeroblob(?))",
+                                           (sha256, size, size))
+                with self.conn.blobopen("blobs", "data", cursor.lastrowid) as blob:
+                    for chunk in iter(lambda: spool.read(CHUNK_SIZE), b""):
+                        blob.write(chunk)
+        return sha256, size
+
+    def open(self, sha256: str) -> BinaryIO:
+        row = self.conn.execute("SELECT rowid FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(sha256)
+        return self.conn.blobopen("blobs", "data", row[0], readonly=True)
+
+    def delete(self, sha256: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+
+    def hashes(self) -> Set[str]:
+        return {row[0] for row in self.conn.execute("SELECT sha256 FROM blobs")}
+
+
+def open_store(location: str):
+    """SQLiteBlobStore for a .db path, FileBlobStore for a directory"""
+    return SQLiteBlobStore(location) if location.endswith(".db") else FileBlobStore(location)
+
+
+def _add_reference_columns(conn: sqlite3.Connection):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(workflows)")}
+    if "pdf_sha256" not in columns:
+        conn.execute("ALTER TABLE workflows ADD COLUMN pdf_sha256 TEXT")
+    if "pdf_size" not in columns:
+        conn.execute("ALTER TABLE workflows ADD COLUMN pdf_size INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workflows_pdf_sha256 ON workflows (pdf_sha256)")
+
+
+def migrate_workflows(db_path: str, store, vacuum: bool = True, allow_synced: bool = False) -> dict:
+    """
+    Move inline workflows.pdf_data into the store. Safe to re-run: only rows
+    that still hold inline bytes are moved.
+
+    Raises RuntimeError for the synced database unless allow_synced is set
+    (see the module docstring).
+    """
+    if os.path.basename(db_path) in SYNCED_DB_NAMES and not allow_synced:
+        raise RuntimeError(f"{db_path} is synced with the server, whose app still reads pdf_data; "
+                           "migrate a copy, or pass --allow-synced once the app reads pdf_sha256")
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            _add_reference_columns(conn)
+        rows = conn.execute("SELECT id FROM workflows WHERE length(pdf_data) > 0").fetchall()
+        moved = bytes_moved = 0
+        new_blobs = set()
+        for (workflow_id,) in rows:
+            with conn.blobopen("workflows", "pdf_data", workflow_id, readonly=True) as inline:
+                sha256, size = store.put(inline)
+            # Blob first, reference second: a crash in between only leaves an unreferenced blob
+            with conn:
+                conn.execute("UPDATE workflows SET pdf_sha256 = ?, pdf_size = ?, pdf_data = x'' WHERE id = ?",
+                             (sha256, size, workflow_id))
+            moved += 1
+            bytes_moved += size
+            new_blobs.add(sha256)
+        with conn:
+            record_migration(conn, MIGRATION_NAME)
+        size_before = os.path.getsize(db_path)
+        if vacuum and moved:
+            conn.execute("VACUUM")
+        stats = {
+            "moved": moved,
+            "bytes_moved": bytes_moved,
+            "unique_blobs": len(new_blobs),
+            "db_bytes_before": size_before,
+            "db_bytes_after": os.path.getsize(db_path),
+        }
+    finally:
+        conn.close()
+    print(f"📦 Moved {moved} PDFs ({bytes_moved / 1024:.1f} KB, {stats['unique_blobs']} unique) to the blob store, "
+          f"database {stats['db_bytes_before'] / 1024:.1f} KB -> {stats['db_bytes_after'] / 1024:.1f} KB")
+    return stats
+
+
+def open_pdf(conn: sqlite3.Connection, store, workflow_id: int) -> BinaryIO:
+    """Lazily readable PDF of a workflow, from the store or (not yet migrated) inline"""
+    row = conn.execute("SELECT pdf_sha256 FROM workflows WHERE id = ?", (workflow_id,)).fetchone()
+    if row is None:
+        raise KeyError(f"Workflow {workflow_id} not found")
+    if row[0]:
+        return store.open(row[0])
+    return conn.blobopen("workflows", "pdf_data", workflow_id, readonly=True)
+
+
+def collect_garbage(db_path: str, store) -> int:
+    """Delete blobs no workflow references; returns how many"""
+    conn = sqlite3.connect(db_path)
+    try:
+        referenced = {row[0] for row in conn.execute("SELECT DISTINCT pdf_sha256 FROM workflows WHERE pdf_sha256 IS NOT NULL")}
+    finally:
+        conn.close()
+    orphans = store.hashes() - referenced
+    for sha256 in orphans:
+        store.delete(sha256)
+    print(f"🧹 Removed {len(orphans)} unreferenced blobs")
+    return len(orphans)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed PDF storage for the workflows database")
+    parser.add_argument("command", choices=["migrate", "cat", "gc"])
+    parser.add_argument("db_path")
+    parser.add_argument("workflow_id", nargs="?", type=int, help="Workflow to print (cat)")
+    parser.add_argument("--store", default="./workflow_blobs", help="Blob directory, or a .db file for the SQLite store")
+    parser.add_argument("--no-vacuum", action="store_true", help="Don't VACUUM after migrating")
+    parser.add_argument("--allow-synced", action="store_true",
+                        help="Migrate the synced database anyway (only once the server app reads pdf_sha256)")
+    args = parser.parse_args()
+
+    store = open_store(args.store)
+    if args.command == "migrate":
+        try:
+            migrate_workflows(args.db_path, store, vacuum=not args.no_vacuum, allow_synced=args.allow_synced)
+        except RuntimeError as e:
+            sys.exit(f"❌ {e}")
+    elif args.command == "gc":
+        collect_garbage(args.db_path, store)
+    else:
+        if args.workflow_id is None:
+            parser.error("cat needs a workflow_id")
+        conn = sqlite3.connect(args.db_path)
+        try:
+            with open_pdf(conn, store, args.workflow_id) as pdf:
+                shutil.copyfileobj(pdf, sys.stdout.buffer, CHUNK_SIZE)
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Cheap change detection for the local SQLite database.
+
+Instead of hashing the whole file on every check, a change token is built
+from what SQLite already tracks:
+- PRAGMA data_version on a long-lived connection, which changes whenever
+  another connection commits (rollback journal and WAL mode alike)
+- the file change counter in the database header (bytes 24-27)
+- the file size and mtime
+- the file's device and inode: a download renames a new file over the
+  database, and the connection (with its data_version) is reopened on it
+
+A check costs one stat, a 100-byte read and a pragma. Files that aren't
+SQLite databases fall back to hashing with a large buffer.
+"""
+
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+from typing import Optional, Tuple
+
+HASH_BUFFER_SIZE = 1024 * 1024
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def file_hash(path: str) -> Optional[str]:
+    """MD5 of a file read in large chunks; None if it doesn't exist"""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatabaseChangeDetector:
+    """Tells whether a SQLite file changed since a previously taken token"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inode: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def _data_version(self) -> Optional[int]:
+        # Read-only so a missing file isn't created; kept open because
+        # data_version is only meaningful across calls on the same connection
+        if self._conn is None:
+            uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        try:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.DatabaseError:
+            self.close()
+            return None
+
+    def token(self) -> Optional[Tuple]:
+        """A value that changes whenever the database content changes; None if the file is missing"""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self.close()
+                return None
+            # A connection on a replaced file would keep watching the old inode,
+            # and in WAL mode commits to the new one change nothing else here
+            inode = (stat.st_dev, stat.st_ino)
+            if inode != self._inode:
+                self.close()
+                self._inode = inode
+            with open(self.path, "rb") as f:
+                header = f.read(100)
+            if header[:16] != SQLITE_HEADER:
+                return ("hash", file_hash(self.path))
+            change_counter = struct.unpack(">I", header[24:28])[0]
+            return (inode, self._data_version(), change_counter, stat.st_size, stat.st_mtime_ns)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,243 @@
+"""
+Row change capture and replay for the workflows database.
+
+Triggers record every insert, update and delete of the synced tables in a
+_sync_changes log, keyed by each table's natural key rather than its
+autoincrement id (ids differ between copies). user_id columns are stored
+as the user's username and resolved again on the other side; usernames of
+deleted users are kept, so rows deleted after their user still log it.
+
+Stdlib only and self-contained: changeset_sync.py runs this file's source
+on the server with `python3 -c`. As a script:
+
+    install <db>                         create the change log and (re)create the triggers
+    export <db> <since_seq> [origin]     JSON changeset on stdout, skipping changes from origin
+    apply <db> <origin>                  JSON list of changes on stdin, applied in one transaction
+    prune <db> <days>                    drop log entries older than days
+"""
+
+import json
+import sqlite3
+import sys
+
+# Synced tables and their natural keys; upserts run in this order, deletes in reverse
+SYNC_TABLES = {
+    "users": ["username"],
+    "usage_tracking": ["user_id", "year", "month"],
+    "templates": ["user_id", "name"],
+    "glossary": ["user_id", "input_language", "target_language", "term", "is_formatting_rule"],
+}
+
+LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS _sync_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    op TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    row TEXT,
+    origin TEXT,
+    changed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS _sync_control (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    origin TEXT
+);
+INSERT OR IGNORE INTO _sync_control (id, origin) VALUES (1, NULL);
+CREATE TABLE IF NOT EXISTS _sync_deleted_users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL
+);
+"""
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _json_expr(ref, columns):
+    """json_object(...) of a trigger row; user_id becomes _username"""
+    parts = []
+    for column in columns:
+        if column == "user_id":
+            # The user may be gone already (deleted first, or a cascade)
+            parts.append(f"'_username', COALESCE((SELECT username FROM users WHERE id = {ref}.user_id), "
+                         f"(SELECT username FROM _sync_deleted_users WHERE id = {ref}.user_id))")
+        else:
+            parts.append(f"'{column}', {ref}.{column}")
+    return f"json_object({', '.join(parts)})"
+
+
+def install(conn):
+    """Create the change log and (re)create the capture triggers, so reinstalling upgrades them"""
+    conn.executescript(LOG_SCHEMA)
+    # Usernames of deleted users; ids are AUTOINCREMENT and never reused
+    conn.execute("DROP TRIGGER IF EXISTS _sync_users_remember")
+    conn.execute("""
+        CREATE TRIGGER _sync_users_remember BEFORE DELETE ON users
+        BEGIN
+            INSERT OR REPLACE INTO _sync_deleted_users (id, username) VALUES (OLD.id, OLD.username);
+        END
+    """)
+    for table, key in SYNC_TABLES.items():
+        columns = [c for c in _columns(conn, table) if c != "id"]
+        changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+        triggers = [
+            ("insert", "INSERT", "", "NEW", _json_expr("NEW", columns)),
+            # Updates log the old key so renames of a key column find the row
+            ("update", "UPDATE", f"WHEN {changed}", "OLD", _json_expr("NEW", columns)),
+            ("delete", "DELETE", "", "OLD", "NULL"),
+        ]
+        for op, event, when, key_ref, row in triggers:
+            conn.execute(f"DROP TRIGGER IF EXISTS _sync_{table}_{op}")
+            conn.execute(f"""
+                CREATE TRIGGER _sync_{table}_{op} AFTER {event} ON {table} {when}
+                BEGIN
+                    INSERT INTO _sync_changes (tbl, op, row_key, row, origin, changed_at)
+                    VALUES ('{table}', '{op}', {_json_expr(key_ref, key)}, {row},
+                            (SELECT origin FROM _sync_control WHERE id = 1),
+                            strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+                END
+            """)
+    conn.commit()
+
+
+def export(conn, since_seq, exclude_origin=None):
+    """
+    Changes logged after since_seq.
+
+    Returns:
+        {"last_seq", "changes"} where last_seq also covers skipped changes,
+        so the caller's cursor moves past its own echoes
+    """
+    last_seq = since_seq
+    changes = []
+    rows = conn.execute(
+        "SELECT seq, tbl, op, row_key, row, origin, changed_at FROM _sync_changes WHERE seq > ? ORDER BY seq",
+        (since_seq,),
+    )
+    for seq, table, op, row_key, row, origin, changed_at in rows:
+        last_seq = seq
+        if exclude_origin is not None and origin == exclude_origin:
+            continue
+        changes.append({
+            "seq": seq,
+            "table": table,
+            "op": op,
+            "key": json.loads(row_key),
+            "row": json.loads(row) if row else None,
+            "changed_at": changed_at,
+        })
+    return {"last_seq": last_seq, "changes": changes}
+
+
+def _resolve_user(conn, values):
+    """Replace _username with the local user_id; None if the user doesn't exist here"""
+    if "_username" not in values:
+        return dict(values)
+    values = dict(values)
+    user = conn.execute("SELECT id FROM users WHERE username = ?", (values.pop("_username"),)).fetchone()
+    if user is None:
+        return None
+    values["user_id"] = user[0]
+    return values
+
+
+def _apply_change(conn, change, columns):
+    """Upsert or delete one row by natural key; returns False if it was skipped"""
+    table = change["table"]
+    key = _resolve_user(conn, change["key"])
+    if key is None:
+        return False
+    where = " AND ".join(f"{column} IS ?" for column in key)
+    if change["op"] == "delete":
+        conn.execute(f"DELETE FROM {table} WHERE {where}", tuple(key.values()))
+        return True
+    row = _resolve_user(conn, change["row"])
+    if row is None:
+        return False
+    row = {column: value for column, value in row.items() if column in columns}
+    existing = conn.execute(f"SELECT id FROM {table} WHERE {where}", tuple(key.values())).fetchone()
+    if existing:
+        assignments = ", ".join(f"{column} = ?" for column in row)
+        conn.execute(f"UPDATE {table} SET {assignments} WHERE id = ?", (*row.values(), existing[0]))
+    else:
+        placeholders = ", ".join("?" for _ in row)
+        conn.execute(f"INSERT INTO {table} ({', '.join(row)}) VALUES ({placeholders})", tuple(row.values()))
+    return True
+
+
+def _apply_order(change):
+    order = list(SYNC_TABLES).index(change["table"])
+    # Parents first for upserts, children first for deletes
+    return (1, -order) if change["op"] == "delete" else (0, order)
+
+
+def apply(conn, changes, origin):
+    """
+    Apply changes in one transaction. The triggers log them with the given
+    origin, so they are not exported back to where they came from. Each
+    change runs in a savepoint, so one that breaks a constraint (a renamed
+    key that is taken here) is rolled back alone instead of the batch.
+
+    Returns:
+        {"applied", "skipped", "failed"}: the count applied, the changes
+        whose user doesn't exist here (yet), for the caller to retry, and
+        {"change", "error"} for each constraint violation
+    """
+    applied = 0
+    skipped, failed = [], []
+    columns = {table: set(_columns(conn, table)) for table in SYNC_TABLES}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("UPDATE _sync_control SET origin = ? WHERE id = 1", (origin,))
+        for change in sorted(changes, key=_apply_order):
+            conn.execute("SAVEPOINT change")
+            try:
+                if _apply_change(conn, change, columns[change["table"]]):
+                    applied += 1
+                else:
+                    skipped.append(change)
+            except sqlite3.IntegrityError as e:
+                conn.execute("ROLLBACK TO change")
+                failed.append({"change": change, "error": str(e)})
+            conn.execute("RELEASE change")
+        conn.execute("UPDATE _sync_control SET origin = NULL WHERE id = 1")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return {"applied": applied, "skipped": skipped, "failed": failed}
+
+
+def prune(conn, days):
+    """Drop log entries older than days"""
+    cursor = conn.execute(
+        "DELETE FROM _sync_changes WHERE changed_at < strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?)",
+        (f"-{int(days)} days",),
+    )
+    conn.commit()
+    return {"pruned": cursor.rowcount}
+
+
+def main(argv):
+    op, db_path = argv[1], argv[2]
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        if op == "install":
+            install(conn)
+            result = {"installed": True}
+        elif op == "export":
+            result = export(conn, int(argv[3]), argv[4] if len(argv) > 4 else None)
+        elif op == "apply":
+            result = apply(conn, json.loads(sys.stdin.read()), argv[3])
+        elif op == "prune":
+            result = prune(conn, int(argv[3]))
+        else:
+            sys.exit(f"Unknown operation: {op}")
+    finally:
+        conn.close()
+    sys.stdout.write(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
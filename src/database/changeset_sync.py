@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Row-level sync of the workflows database between the local copy and the server.
+
+Both sides capture row changes with triggers (changeset.py). A sync pulls
+the server's changes since the last sync and pushes the local ones,
+coalesced to one net change per row, and applies each side's changes to
+the other in a single transaction. When the same row changed on both
+sides, the table's conflict policy decides the result. Changes that can't
+be applied yet because their user doesn't exist on the other side are kept
+and retried on later syncs; a change that breaks a constraint there is
+reported as a conflict. Cost scales with
+the rows changed, not with the size of the database (workflows.pdf_data
+is not part of the row sync).
+
+Try it against a second local database standing in for the server:
+    python changeset_sync.py ./local_workflows.db /tmp/server/workflows.db --init
+    python changeset_sync.py ./local_workflows.db /tmp/server/workflows.db
+"""
+
+import argparse
+import datetime
+import json
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import changeset
+from delta_sync import LocalShellTransport
+
+with open(changeset.__file__, "r", encoding="utf-8") as _f:
+    CHANGESET_SOURCE = _f.read()
+
+# What happens when a row changed on both sides since the last sync
+CONFLICT_POLICIES = {
+    "users": "server_wins",            # accounts and limits are managed by the app
+    "usage_tracking": "max_calls_used",  # counters only grow; keep the higher count (see _max_calls_used)
+    "templates": "latest_wins",
+    "glossary": "local_wins",          # curated by hand in TablePlus
+}
+
+# Origin tag of changes applied from the server, so they aren't pushed back
+SERVER_ORIGIN = "server"
+
+# Days of change log kept on the server for peers that sync rarely; also how
+# long changes waiting for their user are retried
+SERVER_LOG_RETENTION_DAYS = 30
+# Seconds between prunes of the server's log, which the app's own writes grow too
+SERVER_PRUNE_INTERVAL = 3600
+
+
+class LocalPeer:
+    """Runs changeset operations on a local database file"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def run(self, op: str, *args, changes: Optional[List[dict]] = None) -> dict:
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            if op == "install":
+                changeset.install(conn)
+                return {"installed": True}
+            if op == "export":
+                return changeset.export(conn, *args)
+            if op == "apply":
+                return changeset.apply(conn, changes, *args)
+            if op == "prune":
+                return changeset.prune(conn, *args)
+            raise ValueError(f"Unknown operation: {op}")
+        finally:
+            conn.close()
+
+
+class RemotePeer:
+    """Runs changeset operations on the server through an SSH transport"""
+
+    def __init__(self, transport, db_path: str):
+        self.transport = transport
+        self.db_path = db_path
+
+    def run(self, op: str, *args, changes: Optional[List[dict]] = None) -> dict:
+        stdin_data = json.dumps(changes).encode() if changes is not None else b""
+        output = self.transport.run_python(CHANGESET_SOURCE, [op, self.db_path, *args], stdin_data)
+        return json.loads(output)
+
+
+def _row_id(change: dict) -> Tuple[str, str]:
+    return change["table"], json.dumps(change["key"], sort_keys=True)
+
+
+def coalesce(changes: List[dict]) -> Dict[Tuple[str, str], dict]:
+    """
+    One net change per row: the key it had before the first change, the
+    operation and values of the last one.
+    """
+    net: Dict[Tuple[str, str], dict] = {}
+    current_key: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for change in changes:
+        row_id = current_key.pop(_row_id(change), _row_id(change))
+        first = net.get(row_id)
+        net[row_id] = {**change, "key": first["key"] if first else change["key"]}
+        if change["op"] != "delete" and change["row"] is not None:
+            # Follow renames of key columns so later changes land on the same row
+            new_key = {column: change["row"].get(column) for column in change["key"]}
+            current_key[(change["table"], json.dumps(new_key, sort_keys=True))] = row_id
+    return net
+
+
+def _max_calls_used(local: dict, server: dict) -> dict:
+    """
+    Merge usage counters: keep the higher calls_used and the later last_updated.
+
+    The log holds only each side's new value, not the one both started
+    from, so calls counted on both sides within one sync interval are not
+    added up: from 5, local +2 and server +4 merge to 9, not 11. Counts
+    only grow and the app does nearly all of the counting, so the result
+    is at worst a little low, never above what either side counted.
+    """
+    if local["op"] == "delete":
+        return server
+    if server["op"] == "delete":
+        return local
+    row = dict(server["row"])
+    row["calls_used"] = max(local["row"].get("calls_used") or 0, server["row"].get("calls_used") or 0)
+    row["last_updated"] = max(local["row"].get("last_updated") or "", server["row"].get("last_updated") or "")
+    return {**server, "op": "update", "row": row}
+
+
+def resolve_conflict(policy: str, local: dict, server: dict) -> dict:
+    """The change both sides should end up with"""
+    if policy == "server_wins":
+        return server
+    if policy == "local_wins":
+        return local
+    if policy == "latest_wins":
+        return local if local["changed_at"] > server["changed_at"] else server
+    if policy == "max_calls_used":
+        return _max_calls_used(local, server)
+    raise ValueError(f"Unknown conflict policy: {policy}")
+
+
+def plan(local_changes: List[dict], server_changes: List[dict],
+         policies: Dict[str, str] = CONFLICT_POLICIES) -> Tuple[List[dict], List[dict], List[dict]]:
+    """
+    Split coalesced changes into what to apply on each side.
+
+    Returns:
+        (to_server, to_local, conflicts)
+    """
+    local = coalesce(local_changes)
+    server = coalesce(server_changes)
+    to_server, to_local, conflicts = [], [], []
+    for row_id in local.keys() | server.keys():
+        if row_id not in server:
+            to_server.append(local[row_id])
+        elif row_id not in local:
+            to_local.append(server[row_id])
+        else:
+            policy = policies[row_id[0]]
+            winner = resolve_conflict(policy, local[row_id], server[row_id])
+            if winner is not server[row_id]:
+                to_server.append(winner)
+            if winner is not local[row_id]:
+                to_local.append(winner)
+            conflicts.append({"table": row_id[0], "key": local[row_id]["key"], "policy": policy,
+                              "winner": "local" if winner is local[row_id] else
+                                        "server" if winner is server[row_id] else "merged"})
+    return to_server, to_local, conflicts
+
+
+def _still_pending(skipped: List[dict]) -> List[dict]:
+    """Skipped changes to retry, minus those older than the log retention"""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=SERVER_LOG_RETENTION_DAYS)
+    oldest = cutoff.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    return [change for change in skipped if change["changed_at"] >= oldest]
+
+
+class ChangesetSync:
+    """Keeps the synced tables of a local database and the server's in step"""
+
+    def __init__(self, local_db_path: str, remote: RemotePeer, policies: Dict[str, str] = CONFLICT_POLICIES):
+        self.local = LocalPeer(local_db_path)
+        self.remote = remote
+        self.policies = policies
+        self._pruned_at: Optional[float] = None
+
+    def _state(self) -> Dict[str, str]:
+        conn = sqlite3.connect(self.local.db_path)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS _sync_state (name TEXT PRIMARY KEY, value TEXT)")
+            return dict(conn.execute("SELECT name, value FROM _sync_state"))
+        finally:
+            conn.close()
+
+    def _save_state(self, **values):
+        conn = sqlite3.connect(self.local.db_path)
+        try:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS _sync_state (name TEXT PRIMARY KEY, value TEXT)")
+                conn.executemany("INSERT OR REPLACE INTO _sync_state (name, value) VALUES (?, ?)",
+                                 [(name, str(value)) for name, value in values.items()])
+        finally:
+            conn.close()
+
+    def install_remote(self):
+        """Add the change log and triggers to the server database (once, before the first download)"""
+        self.remote.run("install")
+
+    def init_local(self):
+        """
+        Start tracking a freshly downloaded copy of the server database.
+
+        The copy carries the server's change log; everything in it is
+        already present locally, so the pull cursor starts after it.
+        """
+        self.local.run("install")
+        conn = sqlite3.connect(self.local.db_path)
+        try:
+            with conn:
+                pulled = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM _sync_changes").fetchone()[0]
+                conn.execute("DELETE FROM _sync_changes")
+        finally:
+            conn.close()
+        # Local seqs continue after the server's (AUTOINCREMENT), so nothing before pulled is local
+        self._save_state(peer_id=uuid.uuid4().hex, pulled_seq=pulled, pushed_seq=pulled,
+                         pending_to_server="[]", pending_to_local="[]")
+
+    def sync(self) -> dict:
+        """Exchange row changes with the server"""
+        state = self._state()
+        if "peer_id" not in state:
+            raise RuntimeError("Local database is not initialised for changeset sync, run init_local first")
+        pushed, pulled, peer_id = int(state["pushed_seq"]), int(state["pulled_seq"]), state["peer_id"]
+
+        local_export = self.local.run("export", pushed, SERVER_ORIGIN)
+        server_export = self.remote.run("export", pulled, peer_id)
+        # Changes skipped last time (their user was missing) go first, so newer ones to the same row win
+        local_changes = json.loads(state.get("pending_to_server", "[]")) + local_export["changes"]
+        server_changes = json.loads(state.get("pending_to_local", "[]")) + server_export["changes"]
+        to_server, to_local, conflicts = plan(local_changes, server_changes, self.policies)
+
+        # Server first: if it fails nothing has changed and the next sync retries.
+        # Applying is idempotent, so a failure between the two steps is safe too.
+        nothing = {"applied": 0, "skipped": [], "failed": []}
+        server_result = self.remote.run("apply", peer_id, changes=to_server) if to_server else nothing
+        local_result = self.local.run("apply", SERVER_ORIGIN, changes=to_local) if to_local else nothing
+        for side, result in (("server", server_result), ("local", local_result)):
+            for failure in result["failed"]:
+                change = failure["change"]
+                conflicts.append({"table": change["table"], "key": change["key"], "policy": "constraint",
+                                  "winner": f"{side} row kept ({failure['error']})"})
+
+        # Only write when something moved: every write touches the file and wakes the watcher
+        values = {
+            "pushed_seq": local_export["last_seq"],
+            "pulled_seq": server_export["last_seq"],
+            "pending_to_server": json.dumps(_still_pending(server_result["skipped"])),
+            "pending_to_local": json.dumps(_still_pending(local_result["skipped"])),
+        }
+        if any(str(value) != state.get(name) for name, value in values.items()):
+            self._save_state(**values)
+            conn = sqlite3.connect(self.local.db_path)
+            try:
+                with conn:
+                    conn.execute("DELETE FROM _sync_changes WHERE seq <= ?", (local_export["last_seq"],))
+            finally:
+                conn.close()
+        # On a timer rather than after pushes: server-side writes alone fill the log
+        if self._pruned_at is None or time.monotonic() - self._pruned_at >= SERVER_PRUNE_INTERVAL:
+            self.remote.run("prune", SERVER_LOG_RETENTION_DAYS)
+            self._pruned_at = time.monotonic()
+
+        stats = {
+            "pushed": server_result["applied"],
+            "pulled": local_result["applied"],
+            "pending": len(server_result["skipped"]) + len(local_result["skipped"]),
+            "conflicts": conflicts,
+        }
+        print(f"🔁 Row sync: {stats['pushed']} pushed, {stats['pulled']} pulled, "
+              f"{len(conflicts)} conflicts, {stats['pending']} waiting for their user")
+        for conflict in conflicts:
+            print(f"   ⚠️  {conflict['table']} {conflict['key']}: {conflict['policy']} -> {conflict['winner']}")
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row-level sync between two workflows databases")
+    parser.add_argument("local_db")
+    # The server side runs in a local shell here; over SSH use tunneldb.py --changesets
+    parser.add_argument("server_db", help="Database standing in for the server's copy")
+    parser.add_argument("--init", action="store_true", help="Install triggers on both sides and reset the cursors")
+    args = parser.parse_args()
+
+    sync = ChangesetSync(args.local_db, RemotePeer(LocalShellTransport(), args.server_db))
+    if args.init:
+        sync.install_remote()
+        sync.init_local()
+    sync.sync()
+
+
+if __name__ == "__main__":
+    main()
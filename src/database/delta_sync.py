@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Page-level delta transfer of SQLite files.
+
+Both sides hash the file in blocks of the database page size and only the
+pages whose checksums differ are sent. SQLite rewrites pages in place, so
+block boundaries never shift and aligned blocks find the same changes a
+rolling window would, without its cost.
+
+The receiving side patches a copy, checks it against the sender's digest
+and installs it (see page_delta.apply_blocks). Downloads hash and
+read the server file from one consistent snapshot in a single command;
+uploads are read from a local snapshot.
+
+Transports:
+- SSHTransport runs page_delta.py on the server over a shared SSH connection
+- LocalShellTransport runs the same commands locally, as an SSH stand-in
+- LocalDirectoryTransport treats a local directory as the server
+
+Try it without a server (the directory plays the server's filesystem):
+    python delta_sync.py upload ./local_workflows.db /data/workflows.db --local-dir /tmp/fake-server
+"""
+
+import argparse
+import io
+import json
+import os
+import shlex
+import subprocess
+import sys
+from typing import Iterable, List, Tuple
+
+import page_delta
+from snapshot import Snapshot
+
+with open(page_delta.__file__, "r", encoding="utf-8") as _f:
+    HELPER_SOURCE = _f.read()
+
+Blocks = Iterable[Tuple[int, bytes]]
+
+
+class LocalDirectoryTransport:
+    """Serves remote paths from a local directory, mainly for testing"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, remote_path: str) -> str:
+        return os.path.join(self.root, remote_path.lstrip("/"))
+
+    def block_hashes(self, remote_path: str, block_size: int = 0) -> Tuple[int, int, List[str]]:
+        path = self._path(remote_path)
+        page_delta.checkpoint(path)
+        page_size = page_delta.sqlite_page_size(path)
+        size, hashes = page_delta.block_hashes(path, block_size or page_size)
+        return size, page_size, hashes
+
+    def diff(self, remote_path: str, block_size: int, hashes: List[str]) -> Tuple[dict, List[Tuple[int, bytes]]]:
+        return page_delta.snapshot_diff(self._path(remote_path), 0, hashes, block_size)
+
+    def write_blocks(self, remote_path: str, blocks: Blocks, size: int, block_size: int, digest: str):
+        path = self._path(remote_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        page_delta.apply_blocks(path, blocks, size, block_size, digest)
+
+
+class SSHTransport:
+    """Runs page_delta.py on the server with python3 over SSH"""
+
+    def __init__(self, pool, python: str = "python3"):
+        """
+        Args:
+            pool: ssh_pool.SSHConnectionPool, so helper calls reuse one connection
+            python: Python interpreter on the server
+        """
+        self.pool = pool
+        self.python = python
+
+    def _exec(self, command: str, stdin_data: bytes = b"") -> bytes:
+        return self.pool.run(command, stdin_data)
+
+    def run_python(self, source: str, args: List, stdin_data: bytes = b"") -> bytes:
+        """Run a self-contained Python script on the server and return its stdout"""
+        quoted = " ".join(shlex.quote(str(arg)) for arg in args)
+        return self._exec(f"{self.python} -c {shlex.quote(source)} {quoted}", stdin_data)
+
+    def _helper(self, op: str, remote_path: str, block_size: int, stdin_data: bytes = b"") -> bytes:
+        return self.run_python(HELPER_SOURCE, [op, remote_path, block_size], stdin_data)
+
+    def block_hashes(self, remote_path: str, block_size: int = 0) -> Tuple[int, int, List[str]]:
+        result = json.loads(self._helper("hashes", remote_path, block_size))
+        return result["size"], result["page_size"], result["hashes"]
+
+    def diff(self, remote_path: str, block_size: int, hashes: List[str]) -> Tuple[dict, List[Tuple[int, bytes]]]:
+        """Changed blocks against our hashes, hashed and read on the server in one command"""
+        request = json.dumps({"block_size": block_size, "hashes": hashes}).encode() + b"\n"
+        output = io.BytesIO(self._helper("diff", remote_path, 0, request))
+        header = json.loads(output.readline())
+        return header, list(page_delta.read_records(output))
+
+    def write_blocks(self, remote_path: str, blocks: Blocks, size: int, block_size: int, digest: str):
+        payload = io.BytesIO()
+        payload.write(json.dumps({"size": size, "digest": digest}).encode() + b"\n")
+        page_delta.write_records(payload, blocks)
+        self._helper("write", remote_path, block_size, payload.getvalue())
+
+
+class LocalShellTransport(SSHTransport):
+    """SSH stand-in: the same helper commands, run in a local shell"""
+
+    def __init__(self):
+        super().__init__(pool=None, python=shlex.quote(sys.executable))
+
+    def _exec(self, command: str, stdin_data: bytes = b"") -> bytes:
+        result = subprocess.run(command, shell=True, input=stdin_data, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Command failed: {result.stderr.decode().strip()}")
+        return result.stdout
+
+
+class DeltaSync:
+    """Uploads and downloads a database by sending only the changed pages"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def _report(self, direction: str, size: int, changed: List[int], total: int, sent: int) -> dict:
+        stats = {"direction": direction, "pages_changed": len(changed), "pages_total": total,
+                 "bytes_sent": sent, "file_bytes": size}
+        print(f"{'⬆️ ' if direction == 'upload' else '⬇️ '} Delta {direction}: {len(changed)}/{total} pages, "
+              f"{sent / 1024:.1f} KB instead of {size / 1024:.1f} KB")
+        return stats
+
+    def upload(self, local_path: str, remote_path: str) -> dict:
+        """
+        Make the remote file match local_path. local_path must not change
+        meanwhile: pass a snapshot (see snapshot.py), not a live database.
+        """
+        block_size = page_delta.sqlite_page_size(local_path)
+        local_size, local_hashes = page_delta.block_hashes(local_path, block_size)
+        if local_size < 0:
+            raise FileNotFoundError(local_path)
+        remote_size, _, remote_hashes = self.transport.block_hashes(remote_path, block_size)
+        changed = page_delta.changed_blocks(local_hashes, remote_hashes)
+        sent = 0
+        if changed or remote_size != local_size:
+            blocks = list(page_delta.read_blocks(local_path, changed, block_size))
+            sent = sum(len(data) for _, data in blocks)
+            # The server patches a copy of its file and only installs it if it matches
+            # our digest, so a file written to since it was hashed is never torn
+            self.transport.write_blocks(remote_path, blocks, local_size, block_size,
+                                        page_delta.blocks_digest(local_hashes))
+        return self._report("upload", local_size, changed, len(local_hashes), sent)
+
+    def download(self, remote_path: str, local_path: str) -> dict:
+        """Make local_path match a consistent snapshot of the remote file"""
+        block_size = page_delta.sqlite_page_size(local_path)
+        # Hash what's committed: pages still in our -wal aren't in the file yet
+        page_delta.checkpoint(local_path)
+        _, local_hashes = page_delta.block_hashes(local_path, block_size)
+        header, blocks = self.transport.diff(remote_path, block_size, local_hashes)
+        remote_size = header["size"]
+        if remote_size < 0:
+            raise FileNotFoundError(remote_path)
+        changed = [index for index, _ in blocks]
+        sent = sum(len(data) for _, data in blocks)
+        if changed or not os.path.exists(local_path) or os.path.getsize(local_path) != remote_size:
+            page_delta.apply_blocks(local_path, blocks, remote_size, header["block_size"], header["digest"])
+        return self._report("download", remote_size, changed, header["blocks"], sent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Page-level delta sync of a SQLite file")
+    parser.add_argument("direction", choices=["upload", "download"])
+    parser.add_argument("local_path")
+    parser.add_argument("remote_path")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--local-dir", help="Directory standing in for the server's filesystem")
+    target.add_argument("--local-shell", action="store_true", help="Run the remote commands in a local shell")
+    args = parser.parse_args()
+
+    if args.local_dir:
+        transport = LocalDirectoryTransport(args.local_dir)
+    else:
+        transport = LocalShellTransport()
+    sync = DeltaSync(transport)
+    if args.direction == "upload":
+        with Snapshot(args.local_path) as snap:
+            sync.upload(snap.path, args.remote_path)
+    else:
+        sync.download(args.remote_path, args.local_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Cached glossary lookups over the glossary table.
+
+Each (user, input language, target language) glossary is loaded once with
+a single index-only query and kept in memory as:
+- terms: dict term -> translation (plus a lowercase map) for O(1) lookups
+- rules: formatting rules, in the order they were added
+- choices: the term list, ready for rapidfuzz.process
+
+Writes made through the service invalidate the affected glossary. Writes
+from anywhere else (the app, TablePlus, a sync) are noticed through
+PRAGMA data_version, checked at most every GLOSSARY_REVALIDATE_INTERVAL
+seconds, and drop the whole cache.
+
+    python glossary_service.py migrate ./local_workflows.db
+    python glossary_service.py show ./local_workflows.db 1 english spanish
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from rapidfuzz import fuzz, process
+
+from sqlite_dal import Database, record_migration
+
+# Defaults, overridable through the environment
+DEFAULT_REVALIDATE_INTERVAL = float(os.environ.get("GLOSSARY_REVALIDATE_INTERVAL", "1"))
+
+MIGRATION_NAME = "add_glossary_lookup_index"
+# The UNIQUE(user_id, input_language, target_language, term, is_formatting_rule)
+# autoindex already has the lookup prefix; this one also covers every column
+# the service reads, so loading a glossary never touches the table
+LOOKUP_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_glossary_lookup
+    ON glossary (user_id, input_language, target_language, is_formatting_rule, term, translation)
+"""
+SELECT_GLOSSARY = """
+    SELECT id, term, translation, is_formatting_rule
+    FROM glossary
+    WHERE user_id = ? AND input_language = ? AND target_language = ?
+"""
+
+GlossaryKey = Tuple[int, str, str]
+
+
+def migrate(db: Database) -> bool:
+    """Add the covering lookup index; returns True if this run recorded the migration"""
+    with db.transaction() as conn:
+        conn.execute(LOOKUP_INDEX)
+        return record_migration(conn, MIGRATION_NAME)
+
+
+class UserGlossary:
+    """One user's glossary for a language pair"""
+
+    __slots__ = ("terms", "rules", "choices", "_lowercase")
+
+    def __init__(self, rows):
+        self.terms: Dict[str, str] = {}
+        rules = []
+        for row_id, term, translation, is_formatting_rule in rows:
+            if is_formatting_rule:
+                rules.append((row_id, translation))
+            else:
+                self.terms[term] = translation
+        self.rules: List[str] = [rule for _, rule in sorted(rules)]
+        self.choices: List[str] = list(self.terms)
+        self._lowercase = {term.lower(): translation for term, translation in self.terms.items()}
+
+    def translate(self, term: str) -> Optional[str]:
+        """Exact match, then case-insensitive"""
+        translation = self.terms.get(term)
+        return translation if translation is not None else self._lowercase.get(term.lower())
+
+    def fuzzy(self, text: str, score_cutoff: float = 85) -> Optional[Tuple[str, str, float]]:
+        """Closest glossary term to text as (term, translation, score), or None below score_cutoff"""
+        match = process.extractOne(text, self.choices, scorer=fuzz.WRatio, score_cutoff=score_cutoff)
+        if match is None:
+            return None
+        term, score, _ = match
+        return term, self.terms[term], score
+
+
+class GlossaryService:
+    """Per-user glossaries loaded once and invalidated on writes"""
+
+    def __init__(self, db: Database, revalidate_interval: float = DEFAULT_REVALIDATE_INTERVAL):
+        self.db = db
+        self.revalidate_interval = revalidate_interval
+        self._cache: Dict[GlossaryKey, UserGlossary] = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, so a load that raced one isn't cached
+        self._generation = 0
+        # data_version is per connection, so external changes are checked on a dedicated one
+        self._version_conn = sqlite3.connect(db.path, check_same_thread=False)
+        self._data_version = self._read_data_version()
+        self._checked_at = time.monotonic()
+        self.loads = 0
+
+    def _read_data_version(self) -> int:
+        return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _revalidate(self):
+        """Drop the cache if another connection committed since the last check; call with _lock held"""
+        now = time.monotonic()
+        if now - self._checked_at < self.revalidate_interval:
+            return
+        self._checked_at = now
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._cache.clear()
+            self._generation += 1
+
+    def get(self, user_id: int, input_language: str, target_language: str) -> UserGlossary:
+        key = (user_id, input_language, target_language)
+        with self._lock:
+            self._revalidate()
+            glossary = self._cache.get(key)
+            generation = self._generation
+        if glossary is None:
+            glossary = UserGlossary(self.db.query(SELECT_GLOSSARY, key))
+            with self._lock:
+                if generation == self._generation:
+                    self._cache[key] = glossary
+                self.loads += 1
+        return glossary
+
+    def get_user_glossary(self, user_id: int, input_language: str, target_language: str) -> Tuple[Dict[str, str], List[str]]:
+        """Returns (glossary_dict, formatting_rules) for user/languages"""
+        glossary = self.get(user_id, input_language, target_language)
+        return glossary.terms, glossary.rules
+
+    def invalidate(self, user_id: Optional[int] = None, input_language: Optional[str] = None,
+                   target_language: Optional[str] = None):
+        """Drop one glossary, all of a user's, or (no arguments) everything"""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._cache.clear()
+            elif input_language is None or target_language is None:
+                for key in [key for key in self._cache if key[0] == user_id]:
+                    del self._cache[key]
+            else:
+                self._cache.pop((user_id, input_language, target_language), None)
+
+    def set_term(self, user_id: int, input_language: str, target_language: str, term: str,
+                 translation: str, is_formatting_rule: bool = False):
+        """Add or update a term (or a formatting rule, stored with its name as term)"""
+        self.db.execute("""
+            INSERT INTO glossary (user_id, input_language, target_language, term, translation,
+                                  is_formatting_rule, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, input_language, target_language, term, is_formatting_rule)
+            DO UPDATE SET translation = excluded.translation
+        """, (user_id, input_language, target_language, term, translation, is_formatting_rule,
+              datetime.datetime.now().isoformat()))
+        self.invalidate(user_id, input_language, target_language)
+
+    def delete_term(self, user_id: int, input_language: str, target_language: str, term: str,
+                    is_formatting_rule: bool = False):
+        self.db.execute("""
+            DELETE FROM glossary
+            WHERE user_id = ? AND input_language = ? AND target_language = ?
+              AND term = ? AND is_formatting_rule = ?
+        """, (user_id, input_language, target_language, term, is_formatting_rule))
+        self.invalidate(user_id, input_language, target_language)
+
+    def close(self):
+        self._version_conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Glossary lookups for the workflows database")
+    parser.add_argument("command", choices=["migrate", "show"])
+    parser.add_argument("db_path")
+    parser.add_argument("user_id", nargs="?", type=int)
+    parser.add_argument("input_language", nargs="?", default="english")
+    parser.add_argument("target_language", nargs="?", default="spanish")
+    args = parser.parse_args()
+
+    db = Database(args.db_path)
+    if args.command == "migrate":
+        added = migrate(db)
+        print("✅ Glossary lookup index added" if added else "✅ Glossary lookup index already in place")
+        return
+    if args.user_id is None:
+        parser.error("show needs a user_id")
+    service = GlossaryService(db)
+    terms, rules = service.get_user_glossary(args.user_id, args.input_language, args.target_language)
+    print(f"📖 {len(terms)} terms, {len(rules)} formatting rules")
+    for term, translation in terms.items():
+        print(f"   {term} → {translation}")
+    for rule in rules:
+        print(f"   📐 {rule}")
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
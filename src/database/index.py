@@ -1,7 +1,8 @@
-import subprocess
 import sys
 import os
 
+from stream_transfer import SSHCommandTransport, pull, push
+
 # Config
 SSH_USER = "root"
 SSH_HOST = "178.156.132.116"
@@ -9,30 +10,23 @@ SSH_KEY = os.path.expanduser("~/.ssh/hetzni")
 REMOTE_DB_PATH = "/var/lib/docker/volumes/samperalabvolume/_data/content.db"
 current_dir = os.path.dirname(os.path.abspath(__file__))
 LOCAL_DB_PATH = os.path.join(current_dir, "content.db")
+SERVER = SSHCommandTransport(SSH_USER, SSH_HOST, SSH_KEY)
 
 def pull_db():
-    """Download the DB from the VPS to local machine."""
+    """Download the DB from the VPS to local machine, compressed on the wire."""
     print(f"Downloading {REMOTE_DB_PATH} from {SSH_HOST} → {LOCAL_DB_PATH}")
-    subprocess.run([
-        "scp",
-        "-i", SSH_KEY,
-        f"{SSH_USER}@{SSH_HOST}:{REMOTE_DB_PATH}",
-        LOCAL_DB_PATH
-    ], check=True)
+    pull(SERVER, REMOTE_DB_PATH, LOCAL_DB_PATH)
     print("✅ Download complete.")
 
 def push_db():
-    """Upload the local DB back to the VPS."""
+    """Upload a consistent, compacted snapshot of the local DB to the VPS, compressed on the wire."""
     if not os.path.exists(LOCAL_DB_PATH):
         print(f"❌ Local DB not found: {LOCAL_DB_PATH}")
         sys.exit(1)
     print(f"Uploading {LOCAL_DB_PATH} → {REMOTE_DB_PATH} on {SSH_HOST}")
-    subprocess.run([
-        "scp",
-        "-i", SSH_KEY,
-        LOCAL_DB_PATH,
-        f"{SSH_USER}@{SSH_HOST}:{REMOTE_DB_PATH}"
-    ], check=True)
+    # Installed next to the DB and renamed into place, so it's never half-written;
+    # owned by the app's user (as tunneldb does), or the app can't write it
+    push(SERVER, LOCAL_DB_PATH, REMOTE_DB_PATH, compact=True, owner="1000:1000", mode="664")
     print("✅ Upload complete.")
 
 if __name__ == "__main__":
@@ -2,21 +2,61 @@
 """
 User Management Tool for Workflows Database
 Adds users to the local database that syncs with the server
+
+Interactive:          python manage_sqlite.py
+Bulk import:          python manage_sqlite.py import users.csv   (or .jsonl)
+Benchmark the import: python manage_sqlite.py benchmark 5000
 """
 
-import sqlite3
+import argparse
+import csv
 import datetime
 import hashlib
+import json
 import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from snapshot import snapshot
+from sqlite_dal import Database
 
 # Configuration - same as tunneldb.py
 LOCAL_DB_PATH = "./local_workflows.db"
+DEFAULT_MAX_CALLS = 50
+
+INSERT_USER = """
+    INSERT INTO users (username, password, max_calls_per_month, created_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (username) DO NOTHING
+"""
+
+# Used by the benchmark when there is no local database to copy the schema from
+USERS_SCHEMA = """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        max_calls_per_month INTEGER DEFAULT 50,
+        created_at TEXT NOT NULL
+    )
+"""
+
+_db = None
+
+def get_db():
+    """Shared connection-managed access to the local database"""
+    global _db
+    if _db is None:
+        _db = Database(LOCAL_DB_PATH)
+    return _db
 
 def hash_password(password):
     """Hash a password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def add_user(username, password, max_calls_per_month=50):
+def add_user(username, password, max_calls_per_month=DEFAULT_MAX_CALLS):
     """Add a new user to the database"""
     if not os.path.exists(LOCAL_DB_PATH):
         print(f"❌ Database file not found: {LOCAL_DB_PATH}")
@@ -24,29 +64,17 @@ def add_user(username, password, max_calls_per_month=50):
         return False
     
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        cursor = conn.cursor()
-        
-        # Check if user already exists
-        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-        if cursor.fetchone():
-            print(f"❌ User '{username}' already exists")
-            return False
-        
         # Hash the password
         hashed_password = hash_password(password)
         
         # Get current timestamp
         created_at = datetime.datetime.now().isoformat()
         
-        # Insert new user
-        cursor.execute("""
-            INSERT INTO users (username, password, max_calls_per_month, created_at)
-            VALUES (?, ?, ?, ?)
-        """, (username, hashed_password, max_calls_per_month, created_at))
-        
-        conn.commit()
-        conn.close()
+        # Insert new user; the UNIQUE username makes this a no-op if it exists
+        cursor = get_db().execute(INSERT_USER, (username, hashed_password, max_calls_per_month, created_at))
+        if cursor.rowcount == 0:
+            print(f"❌ User '{username}' already exists")
+            return False
         
         print(f"✅ User '{username}' added successfully!")
         print(f"   Max calls per month: {max_calls_per_month}")
@@ -62,6 +90,89 @@ def add_user(username, password, max_calls_per_month=50):
         print(f"❌ Error: {e}")
         return False
 
+def read_user_records(path):
+    """Yield dicts with username, password and optional max_calls_per_month from a CSV or JSONL file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+def user_rows(records, created_at):
+    """Validated INSERT_USER parameters; invalid records are reported and skipped"""
+    for number, record in enumerate(records, start=1):
+        username = (record.get("username") or "").strip()
+        password = (record.get("password") or "").strip()
+        if not username or not password:
+            print(f"⚠️  Record {number}: username and password are required, skipped")
+            continue
+        max_calls = record.get("max_calls_per_month")
+        try:
+            max_calls = int(max_calls) if max_calls not in (None, "") else DEFAULT_MAX_CALLS
+        except ValueError:
+            print(f"⚠️  Record {number}: invalid max_calls_per_month, using default {DEFAULT_MAX_CALLS}")
+            max_calls = DEFAULT_MAX_CALLS
+        yield username, hash_password(password), max_calls, created_at
+
+def import_users(path, db=None):
+    """Insert every user in a CSV/JSONL file in one transaction; existing usernames are skipped"""
+    db = db or get_db()
+    records = list(read_user_records(path))
+    start = time.perf_counter()
+    inserted = db.executemany(INSERT_USER, user_rows(records, datetime.datetime.now().isoformat()))
+    elapsed = time.perf_counter() - start
+    print(f"✅ Imported {inserted} of {len(records)} users in {elapsed * 1000:.1f} ms "
+          f"({len(records) - inserted} skipped)")
+    return inserted
+
+def add_user_per_row(db_path, username, password, max_calls_per_month=DEFAULT_MAX_CALLS):
+    """The old add_user path (connect, SELECT, INSERT, commit per user), kept for the benchmark"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+    if not cursor.fetchone():
+        cursor.execute("""
+            INSERT INTO users (username, password, max_calls_per_month, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (username, hash_password(password), max_calls_per_month, datetime.datetime.now().isoformat()))
+        conn.commit()
+    conn.close()
+
+def benchmark_import(count):
+    """Time adding count users row by row vs one bulk import, on scratch copies of the database"""
+    workdir = tempfile.mkdtemp(prefix="user-import-")
+    try:
+        records_path = os.path.join(workdir, "users.jsonl")
+        with open(records_path, "w") as f:
+            for i in range(count):
+                f.write(json.dumps({"username": f"bench_user_{i}", "password": f"secret{i}"}) + "\n")
+
+        paths = [os.path.join(workdir, name) for name in ("per_row.db", "bulk.db")]
+        for path in paths:
+            if os.path.exists(LOCAL_DB_PATH):
+                # A consistent copy even if the app is writing the database meanwhile
+                snapshot(LOCAL_DB_PATH, path)
+            else:
+                sqlite3.connect(path).executescript(USERS_SCHEMA).close()
+
+        start = time.perf_counter()
+        for record in read_user_records(records_path):
+            add_user_per_row(paths[0], record["username"], record["password"])
+        per_row = time.perf_counter() - start
+
+        db = Database(paths[1])
+        start = time.perf_counter()
+        import_users(records_path, db)
+        bulk = time.perf_counter() - start
+        db.close()
+
+        print(f"⏱️  Per-row: {per_row:.2f}s ({count / per_row:,.0f} users/s)")
+        print(f"⏱️  Bulk:    {bulk:.2f}s ({count / bulk:,.0f} users/s), {per_row / bulk:.0f}x faster")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
 def list_users():
     """List all users in the database"""
     if not os.path.exists(LOCAL_DB_PATH):
@@ -69,13 +180,7 @@ def list_users():
         return False
     
     try:
-        conn = sqlite3.connect(LOCAL_DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, username, max_calls_per_month, created_at FROM users ORDER BY id")
-        users = cursor.fetchall()
-        
-        conn.close()
+        users = get_db().query("SELECT id, username, max_calls_per_month, created_at FROM users ORDER BY id")
         
         if not users:
             print("📋 No users found in database")
@@ -98,7 +203,7 @@ def list_users():
         print(f"❌ Database error: {e}")
         return False
 
-def main():
+def interactive():
     print("👤 User Management Tool")
     print("1. Add new user")
     print("2. List all users")
@@ -135,5 +240,24 @@ def main():
     else:
         print("❌ Invalid option")
 
+def main():
+    parser = argparse.ArgumentParser(description="User management for the workflows database")
+    subcommands = parser.add_subparsers(dest="command")
+    import_parser = subcommands.add_parser("import", help="Bulk import users from CSV or JSONL")
+    import_parser.add_argument("path", help="File with username, password[, max_calls_per_month]")
+    benchmark_parser = subcommands.add_parser("benchmark", help="Per-row vs bulk user import")
+    benchmark_parser.add_argument("count", type=int, nargs="?", default=5000)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        if not os.path.exists(LOCAL_DB_PATH):
+            print(f"❌ Database file not found: {LOCAL_DB_PATH}")
+            return
+        import_users(args.path)
+    elif args.command == "benchmark":
+        benchmark_import(args.count)
+    else:
+        interactive()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""
+Page checksums and page patches for SQLite files.
+
+Stdlib only and self-contained: the SSH transport in delta_sync.py runs
+this file's source on the server with `python3 -c`, so both sides compute
+checksums with the same code. As a script:
+
+    hashes <path> <block_size>   JSON {"size", "page_size", "hashes"} on stdout
+    diff <path> <block_size>     JSON {"block_size", "hashes"} of the other side's
+                                 copy on stdin; JSON header line (size, page_size,
+                                 block_size, blocks, digest) then records on stdout
+    write <path> <block_size>    JSON {"size", "digest"} line then records on stdin
+    install <path> 0             put the checked file <path>.incoming at path (see install)
+
+A block_size of 0 means the file's own SQLite page size. Files are hashed
+after a checkpoint, so commits still in a -wal count. Records are a
+big-endian (index, length) header followed by the block bytes.
+
+Blocks are never written into the live file: they go into a copy next to
+the target, and the copy is checked against the digest of the source's
+block hashes. Only then is it installed. A database is overwritten through
+the backup API, under SQLite's own locks and journal. The app and TablePlus
+can keep it open: they wait for the install like for any other writer, then
+read the new content from the same file, and a live -wal stays valid.
+Renaming a new file over a database that is open would send their later
+writes to the unlinked old file, where they'd be lost.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+
+DEFAULT_PAGE_SIZE = 4096
+INSTALL_BUSY_TIMEOUT = 30  # seconds to wait for the app's locks before giving up
+SQLITE_HEADER = b"SQLite format 3\x00"
+RECORD = struct.Struct(">QI")
+
+
+def sqlite_page_size(path, default=DEFAULT_PAGE_SIZE):
+    """Page size from the SQLite header, or default for missing/non-SQLite files"""
+    if not os.path.exists(path):
+        return default
+    with open(path, "rb") as f:
+        header = f.read(18)
+    if header[:16] != SQLITE_HEADER:
+        return default
+    size = struct.unpack(">H", header[16:18])[0]
+    return 65536 if size == 1 else size
+
+
+def _is_sqlite(path):
+    if not os.path.exists(path):
+        return False
+    with open(path, "rb") as f:
+        return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+def checkpoint(path):
+    """
+    Fold a live WAL into path, so the file alone holds every commit. Only
+    when both -wal and -shm exist: run as root on the server, opening the
+    database would otherwise create a -shm the app can't write.
+    """
+    wal = path + "-wal"
+    if not (os.path.exists(wal) and os.path.getsize(wal) and os.path.exists(path + "-shm")):
+        return
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    finally:
+        conn.close()
+
+
+def block_hashes(path, block_size):
+    """(file size, md5 of every block); (-1, []) if the file doesn't exist"""
+    if not os.path.exists(path):
+        return -1, []
+    hashes = []
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            hashes.append(hashlib.md5(block).hexdigest())
+    return os.path.getsize(path), hashes
+
+
+def blocks_digest(hashes):
+    """Digest of a whole file from its block hashes, so both sides can compare files"""
+    return hashlib.md5("".join(hashes).encode()).hexdigest()
+
+
+def changed_blocks(source_hashes, target_hashes):
+    """Indices of source blocks that are missing or different on the target"""
+    return [
+        i for i, digest in enumerate(source_hashes)
+        if i >= len(target_hashes) or target_hashes[i] != digest
+    ]
+
+
+def consistent_copy(path, dest):
+    """
+    Copy path to dest as a committed state: SQLite files through the backup
+    API, under a read transaction, page for page, in rollback-journal mode;
+    other files as they are.
+    """
+    if not _is_sqlite(path):
+        shutil.copyfile(path, dest)
+        return
+    source = sqlite3.connect("file:%s?mode=ro" % os.path.abspath(path), uri=True)
+    try:
+        target = sqlite3.connect(dest)
+        try:
+            source.backup(target)
+            # The backup keeps the source's WAL flag in the header
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+def snapshot_diff(path, block_size, target_hashes, target_block_size):
+    """
+    Header and changed blocks of path against a copy with target_hashes.
+
+    Hashes and blocks come from one consistent snapshot, so a database
+    written to meanwhile never yields a mix of old and new pages. Hashes
+    taken with another block size can't be compared; every block is sent.
+    """
+    if not os.path.exists(path):
+        return {"size": -1}, []
+    fd, snapshot_path = tempfile.mkstemp(prefix="page-delta-")
+    os.close(fd)
+    try:
+        consistent_copy(path, snapshot_path)
+        page_size = sqlite_page_size(snapshot_path)
+        block_size = block_size or page_size
+        size, hashes = block_hashes(snapshot_path, block_size)
+        if target_block_size != block_size:
+            target_hashes = []
+        blocks = list(read_blocks(snapshot_path, changed_blocks(hashes, target_hashes), block_size))
+    finally:
+        os.remove(snapshot_path)
+    header = {"size": size, "page_size": page_size, "block_size": block_size,
+              "blocks": len(hashes), "digest": blocks_digest(hashes)}
+    return header, blocks
+
+
+def read_blocks(path, indices, block_size):
+    """Yield (index, bytes) for the given block indices"""
+    with open(path, "rb") as f:
+        for index in indices:
+            f.seek(index * block_size)
+            yield index, f.read(block_size)
+
+
+def write_records(out, blocks):
+    for index, data in blocks:
+        out.write(RECORD.pack(index, len(data)))
+        out.write(data)
+
+
+def read_records(stream):
+    """Yield (index, bytes) records until the stream ends"""
+    while True:
+        header = stream.read(RECORD.size)
+        if len(header) < RECORD.size:
+            return
+        index, length = RECORD.unpack(header)
+        yield index, stream.read(length)
+
+
+def _copy_owner(path, dest):
+    st = os.stat(path)
+    try:
+        os.chown(dest, st.st_uid, st.st_gid)
+    except PermissionError:
+        pass  # not root: dest keeps our own user, as the old file had to be ours to replace it
+
+
+def install(staging, path):
+    """
+    Put the content of staging, a complete and checked file, at path, and
+    remove staging.
+
+    An existing database is overwritten with the backup API in one SQLite
+    write transaction. Connections the app or TablePlus keep open stay
+    valid (see the module docstring). The transaction waits up to
+    INSTALL_BUSY_TIMEOUT for their locks, and the whole file goes through
+    the journal. A WAL database needs staging to have its page size.
+    Anything else, or a missing path, is renamed into place.
+    """
+    try:
+        if not (_is_sqlite(path) and _is_sqlite(staging)):
+            os.replace(staging, path)
+            return
+        source = sqlite3.connect("file:%s?mode=ro" % os.path.abspath(staging), uri=True)
+        try:
+            target = sqlite3.connect(path, timeout=INSTALL_BUSY_TIMEOUT)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+        # A -wal/-shm we (root on the server) just created must stay writable for the app
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                _copy_owner(path, path + suffix)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+
+
+def apply_blocks(path, blocks, size, block_size, digest=None):
+    """
+    Make path the patched file: blocks are written into a copy of path,
+    truncated to size, checked against digest (see blocks_digest) and the
+    copy is installed at path (see install).
+
+    Raises:
+        ValueError: If the patched copy doesn't match digest, e.g. because
+            path changed after its hashes were taken; path is left untouched
+    """
+    staging = path + ".incoming"
+    try:
+        if os.path.exists(path):
+            shutil.copyfile(path, staging)
+            shutil.copymode(path, staging)
+            _copy_owner(path, staging)
+        with open(staging, "r+b" if os.path.exists(staging) else "w+b") as out:
+            for index, data in blocks:
+                out.seek(index * block_size)
+                out.write(data)
+            out.truncate(size)
+            out.flush()
+            os.fsync(out.fileno())
+        if digest is not None and blocks_digest(block_hashes(staging, block_size)[1]) != digest:
+            raise ValueError("%s changed during the transfer, patched copy doesn't match" % path)
+        install(staging, path)
+    except BaseException:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+
+
+def main(argv):
+    op, path, block_size = argv[1], argv[2], int(argv[3])
+    page_size = sqlite_page_size(path)
+    block_size = block_size or page_size
+    if op == "hashes":
+        checkpoint(path)
+        size, hashes = block_hashes(path, block_size)
+        sys.stdout.write(json.dumps({"size": size, "page_size": page_size, "hashes": hashes}))
+    elif op == "diff":
+        target = json.loads(sys.stdin.readline())
+        header, blocks = snapshot_diff(path, block_size, target["hashes"], target["block_size"])
+        sys.stdout.buffer.write(json.dumps(header).encode() + b"\n")
+        write_records(sys.stdout.buffer, blocks)
+    elif op == "write":
+        header = json.loads(sys.stdin.buffer.readline())
+        apply_blocks(path, read_records(sys.stdin.buffer), header["size"], block_size, header.get("digest"))
+    elif op == "install":
+        install(path + ".incoming", path)
+    else:
+        sys.exit(f"Unknown operation: {op}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Consistent snapshots of a live SQLite database for upload.
+
+Copying the file while TablePlus (or the app) is in the middle of a
+transaction can ship a torn database. The sqlite3 backup API copies the
+pages under a read transaction instead, so the snapshot is always a
+committed state. VACUUM INTO gives a compacted copy for full transfers,
+and the snapshot can be compressed with gzip or zstd before sending.
+
+    with Snapshot("./local_workflows.db") as snap:
+        DeltaSync(transport).upload(snap.path, remote_path)
+        upload(snap.compressed(), ...)
+"""
+
+import gzip
+import os
+import shlex
+import shutil
+import sqlite3
+import tempfile
+import zlib
+from typing import Optional
+
+import page_delta
+
+# gzip is always available; zstd needs the zstandard package here and zstd on the server
+DB_SNAPSHOT_CODEC = os.getenv("DB_SNAPSHOT_CODEC", "gzip")
+COPY_BUFFER_SIZE = 1024 * 1024
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Run on the server with `python3 -c` to install an uploaded file (see page_delta.install)
+with open(page_delta.__file__, "r", encoding="utf-8") as _f:
+    PAGE_DELTA_SOURCE = _f.read()
+
+CODECS = {
+    "gzip": {"suffix": ".gz", "compress_command": "gzip -6c", "decompress_command": "gzip -dc"},
+    "zstd": {"suffix": ".zst", "compress_command": "zstd -10c", "decompress_command": "zstd -dc"},
+}
+
+
+def snapshot(db_path: str, dest_path: str, compact: bool = False) -> str:
+    """
+    Write a transactionally consistent copy of db_path to dest_path.
+
+    The copy is in rollback-journal mode whatever db_path uses: a WAL flag
+    in the uploaded header would switch the server's database to WAL.
+
+    Args:
+        compact: VACUUM INTO a defragmented copy instead of a page-for-page
+            backup (smaller, but page positions change, which defeats delta sync)
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(db_path)
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    source = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        if compact:
+            source.execute("VACUUM INTO ?", (dest_path,))
+        dest = sqlite3.connect(dest_path)
+        try:
+            if not compact:
+                # All pages in one step, so concurrent writers can't force a restart
+                source.backup(dest)
+            dest.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dest.close()
+    finally:
+        source.close()
+    return dest_path
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd compression requires the zstandard package (pip install zstandard, or the \"fast\" extra)")
+    return zstandard
+
+
+def open_compressed(path: str, mode: str, codec: str = DB_SNAPSHOT_CODEC):
+    """Binary file object that (de)compresses path on the fly"""
+    if codec == "gzip":
+        # Level 6: most of level 9's ratio on SQLite pages at a fraction of the CPU
+        return gzip.open(path, mode, compresslevel=6) if "w" in mode else gzip.open(path, mode)
+    if codec == "zstd":
+        zstandard = _zstd()
+        if "w" in mode:
+            return zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"), closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def compressor(codec: str = DB_SNAPSHOT_CODEC):
+    """Incremental compressor with compress(chunk) and flush()"""
+    if codec == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=10).compressobj()
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompressing_reader(fileobj, codec: str = DB_SNAPSHOT_CODEC):
+    """
+    File object reading decompressed data from a compressed stream.
+    read(n) returns at most n bytes, however well the input compressed.
+    """
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().stream_reader(fileobj)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def compress_file(src_path: str, dest_path: str, codec: str = DB_SNAPSHOT_CODEC) -> str:
+    """Stream src_path through the compressor into dest_path"""
+    with open(src_path, "rb") as src, open_compressed(dest_path, "wb", codec) as dest:
+        shutil.copyfileobj(src, dest, COPY_BUFFER_SIZE)
+    return dest_path
+
+
+def decompress_file(src_path: str, dest_path: str, codec: str = DB_SNAPSHOT_CODEC) -> str:
+    with open_compressed(src_path, "rb", codec) as src, open(dest_path, "wb") as dest:
+        shutil.copyfileobj(src, dest, COPY_BUFFER_SIZE)
+    return dest_path
+
+
+def remote_checkpoint_command(remote_path: str, python: str = "python3") -> str:
+    """
+    Shell command folding a live WAL into remote_path, so reading or hashing
+    the file alone sees every commit (see page_delta.checkpoint). Always
+    succeeds; a busy checkpoint just leaves the WAL for the next one.
+    """
+    source = "import sqlite3, sys; sqlite3.connect(sys.argv[1]).execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()"
+    return (f"{{ test ! -s {remote_path}-wal || test ! -f {remote_path}-shm || "
+            f"{python} -c {shlex.quote(source)} {remote_path} || true; }}")
+
+
+def remote_install_command(compressed_path: Optional[str], remote_path: str, codec: str = DB_SNAPSHOT_CODEC,
+                           owner: Optional[str] = None, mode: Optional[str] = None, python: str = "python3") -> str:
+    """
+    Shell command that decompresses an uploaded snapshot (or stdin, when
+    compressed_path is None) next to remote_path, checks it and installs it
+    with page_delta.install: an existing database is overwritten under
+    SQLite's locks, so the app's open connections stay valid; otherwise the
+    file is renamed into place. Readers never see a partial file. owner and
+    mode apply to a renamed file and default to the old file's, so the app's
+    user can still write it.
+    """
+    staging = f"{remote_path}.incoming"
+    decompress = CODECS[codec]["decompress_command"]
+    if compressed_path is None:
+        steps = [f"{decompress} > {staging}"]
+    else:
+        steps = [f"{decompress} {compressed_path} > {staging}", f"rm -f {compressed_path}"]
+    steps.append(f"test \"$(head -c 15 {staging})\" = 'SQLite format 3'")
+    keep = f"test ! -e {remote_path} || "
+    steps.append(f"chown {owner} {staging}" if owner else f"{{ {keep}chown --reference={remote_path} {staging}; }}")
+    steps.append(f"chmod {mode} {staging}" if mode else f"{{ {keep}chmod --reference={remote_path} {staging}; }}")
+    steps.append(f"{python} -c {shlex.quote(PAGE_DELTA_SOURCE)} install {remote_path} 0")
+    return " && ".join(steps)
+
+
+class Snapshot:
+    """A consistent snapshot (and its compressed form) in a temp dir, removed on exit"""
+
+    def __init__(self, db_path: str, compact: bool = False, codec: str = DB_SNAPSHOT_CODEC):
+        self.db_path = db_path
+        self.compact = compact
+        self.codec = codec
+        self.path: Optional[str] = None
+        self._compressed: Optional[str] = None
+        self._dir: Optional[str] = None
+
+    def __enter__(self) -> "Snapshot":
+        self._dir = tempfile.mkdtemp(prefix="dbsnapshot-")
+        self.path = snapshot(self.db_path, os.path.join(self._dir, os.path.basename(self.db_path)), self.compact)
+        return self
+
+    def compressed(self) -> str:
+        """Path of the compressed snapshot, created on first use"""
+        if self._compressed is None:
+            self._compressed = compress_file(self.path, self.path + CODECS[self.codec]["suffix"], self.codec)
+            size, packed = os.path.getsize(self.path), os.path.getsize(self._compressed)
+            print(f"🗜️  Snapshot compressed with {self.codec}: {size / 1024:.1f} KB -> {packed / 1024:.1f} KB")
+        return self._compressed
+
+    def __exit__(self, *exc):
+        shutil.rmtree(self._dir, ignore_errors=True)
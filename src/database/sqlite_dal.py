@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Small data-access layer for the local SQLite databases.
+
+Database keeps one connection per thread (sqlite3 connections shouldn't be
+shared across threads) and reuses it for every call from that thread,
+instead of connecting per operation. Connections run in WAL mode with a
+busy timeout, autocommit by default, with explicit transactions for
+anything that writes more than one statement:
+
+    db = Database("./local_workflows.db")
+    users = db.query("SELECT id, username FROM users")
+    with db.transaction() as conn:
+        conn.executemany("INSERT INTO ...", rows)
+"""
+
+import datetime
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+BUSY_TIMEOUT_SECONDS = 10
+
+
+class Database:
+    """Per-thread pooled connections to one SQLite file"""
+
+    def __init__(self, path: str, wal: bool = True):
+        self.path = path
+        self.wal = wal
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; transaction() opens explicit ones. check_same_thread is off
+            # only so close() can close every thread's connection.
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS,
+                                   isolation_level=None, check_same_thread=False)
+            if self.wal:
+                # Persistent in the file; synced snapshots are switched back (see snapshot.py)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """BEGIN IMMEDIATE ... COMMIT, rolled back on error; nested calls join the outer one"""
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql: str, rows: Iterable[Sequence[Any]]) -> int:
+        """Run sql for every row in a single transaction; returns the rows changed"""
+        with self.transaction() as conn:
+            # rowcount sums changes() per row, which leaves out rows written by triggers
+            return conn.executemany(sql, rows).rowcount
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return self.connection().execute(sql, params).fetchone()
+
+    def close(self):
+        """Close every thread's connection (the last close checkpoints the WAL)"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def record_migration(conn: sqlite3.Connection, name: str) -> bool:
+    """
+    Add name to the app's migration_history (next version number) unless
+    it's already there or the table doesn't exist. Returns True if added.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'migration_history'").fetchone() is None:
+        return False
+    if conn.execute("SELECT 1 FROM migration_history WHERE name = ?", (name,)).fetchone():
+        return False
+    version = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM migration_history").fetchone()[0]
+    conn.execute("INSERT INTO migration_history (version, name, applied_at) VALUES (?, ?, ?)",
+                 (version, name, datetime.datetime.now().isoformat()))
+    return True
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Shared SSH connection for the database sync.
+
+Opening a paramiko SSHClient costs a TCP connect, key exchange and auth.
+The pool keeps one authenticated connection alive (with transport
+keep-alives) and opens a cheap channel on it per command. A dead
+connection is detected before use and replaced transparently.
+"""
+
+import threading
+from typing import Callable, Optional, Tuple
+
+import paramiko
+
+KEEPALIVE_INTERVAL = 30  # seconds, below typical NAT/firewall idle timeouts
+
+
+class SSHConnectionPool:
+    """One reusable SSH connection, shared by every sync operation and thread"""
+
+    def __init__(self, connect: Callable[[], paramiko.SSHClient], keepalive: int = KEEPALIVE_INTERVAL):
+        """
+        Args:
+            connect: Opens and authenticates a new paramiko.SSHClient
+            keepalive: Seconds between transport keep-alive packets
+        """
+        self._connect = connect
+        self.keepalive = keepalive
+        self._client: Optional[paramiko.SSHClient] = None
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.commands = 0
+
+    def _healthy(self) -> bool:
+        transport = self._client.get_transport() if self._client else None
+        return transport is not None and transport.is_active()
+
+    def client(self) -> paramiko.SSHClient:
+        """The shared client, reconnecting if the connection dropped"""
+        with self._lock:
+            if not self._healthy():
+                if self._client is not None:
+                    print("🔌 SSH connection lost, reconnecting...")
+                    self._client.close()
+                self._client = self._connect()
+                self._client.get_transport().set_keepalive(self.keepalive)
+                self.connects += 1
+            return self._client
+
+    def _open_channel(self) -> paramiko.Channel:
+        try:
+            return self.client().get_transport().open_session()
+        except (paramiko.SSHException, EOFError, OSError):
+            # The connection died after the health check; nothing ran yet, so retrying is safe
+            self.reset()
+            return self.client().get_transport().open_session()
+
+    def exec(self, command: str, stdin_data: bytes = b"") -> Tuple[int, bytes, bytes]:
+        """
+        Run a command on its own channel.
+
+        Returns:
+            (exit status, stdout, stderr)
+        """
+        channel = self._open_channel()
+        self.commands += 1
+        try:
+            channel.exec_command(command)
+            if stdin_data:
+                channel.sendall(stdin_data)
+            channel.shutdown_write()
+            stdout = channel.makefile("rb").read()
+            stderr = channel.makefile_stderr("rb").read()
+            return channel.recv_exit_status(), stdout, stderr
+        finally:
+            channel.close()
+
+    def run(self, command: str, stdin_data: bytes = b"") -> bytes:
+        """Run a command and return its stdout, raising on a non-zero exit"""
+        status, stdout, stderr = self.exec(command, stdin_data)
+        if status != 0:
+            raise RuntimeError(f"Remote command failed: {stderr.decode().strip()}")
+        return stdout
+
+    def transport(self) -> paramiko.Transport:
+        """The live transport, e.g. for SCPClient"""
+        return self.client().get_transport()
+
+    def reset(self):
+        """Drop the connection; the next operation reconnects"""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def close(self):
+        self.reset()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Compressed streaming transfer of database files over SSH.
+
+The file is read in chunks, compressed on the fly and piped into a remote
+command that decompresses it, and the other way round for downloads.
+Memory use is constant whatever the file size, no compressed copy is
+staged on disk, and progress and throughput are reported as the bytes go
+by. Files land next to the target and are installed once complete and
+checked (see page_delta.install).
+
+Transports:
+- SSHCommandTransport runs the remote side with the ssh CLI
+- LocalProcessTransport runs it in a local shell, for offline tests
+
+Try it without a server:
+    python stream_transfer.py push ./content.db /tmp/fake-server/content.db --local-process
+    python stream_transfer.py pull ./content.db /tmp/fake-server/content.db --local-process
+"""
+
+import argparse
+import os
+import shlex
+import subprocess
+import time
+from typing import Optional
+
+from snapshot import (
+    CODECS,
+    DB_SNAPSHOT_CODEC,
+    SQLITE_HEADER,
+    Snapshot,
+    compressor,
+    decompressing_reader,
+    remote_checkpoint_command,
+    remote_install_command,
+)
+from page_delta import install
+
+CHUNK_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 0.5  # seconds between progress lines
+
+
+class SSHCommandTransport:
+    """Runs remote commands with the ssh CLI"""
+
+    def __init__(self, user: str, host: str, key_path: str):
+        self.user = user
+        self.host = host
+        self.key_path = key_path
+
+    def popen(self, command: str, **kwargs) -> subprocess.Popen:
+        return subprocess.Popen(["ssh", "-i", self.key_path, f"{self.user}@{self.host}", command], **kwargs)
+
+
+class LocalProcessTransport:
+    """Runs the "remote" commands in a local shell, as an SSH stand-in"""
+
+    def popen(self, command: str, **kwargs) -> subprocess.Popen:
+        return subprocess.Popen(["sh", "-c", command], **kwargs)
+
+
+class CountingReader:
+    """Counts the bytes read from a stream (compressed bytes on the wire)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class TransferProgress:
+    """Prints progress and throughput of a transfer"""
+
+    def __init__(self, label: str, total: Optional[int]):
+        self.label = label
+        self.total = total
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.start = time.perf_counter()
+        self._last_print = 0.0
+
+    def update(self, raw: int = 0, wire: int = 0):
+        self.raw_bytes += raw
+        self.wire_bytes += wire
+        now = time.perf_counter()
+        if now - self._last_print >= PROGRESS_INTERVAL:
+            self._last_print = now
+            print(f"\r{self._line(now)}", end="", flush=True)
+
+    def _line(self, now: float) -> str:
+        elapsed = max(now - self.start, 1e-9)
+        done = f"{self.raw_bytes / self.total:6.1%} " if self.total else ""
+        return (f"{self.label} {done}{self.raw_bytes / 1e6:.1f} MB, "
+                f"{self.wire_bytes / 1e6:.1f} MB on the wire, {self.raw_bytes / elapsed / 1e6:.1f} MB/s")
+
+    def finish(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        print(f"\r{self._line(time.perf_counter())} in {elapsed:.1f}s")
+        return {
+            "bytes": self.raw_bytes,
+            "wire_bytes": self.wire_bytes,
+            "ratio": round(self.wire_bytes / self.raw_bytes, 4) if self.raw_bytes else None,
+            "seconds": round(elapsed, 3),
+            "mb_per_s": round(self.raw_bytes / elapsed / 1e6, 2) if elapsed else None,
+        }
+
+
+def _wait(process: subprocess.Popen, what: str):
+    stderr = process.stderr.read().decode().strip() if process.stderr else ""
+    if process.wait() != 0:
+        raise RuntimeError(f"{what} failed: {stderr or f'exit status {process.returncode}'}")
+
+
+def push(transport, local_path: str, remote_path: str, codec: str = DB_SNAPSHOT_CODEC,
+         compact: bool = True, owner: Optional[str] = None, mode: Optional[str] = None) -> dict:
+    """
+    Stream a consistent, compressed snapshot of local_path to remote_path.
+    owner ("uid:gid") and mode default to those of the file being replaced.
+    """
+    with Snapshot(local_path, compact=compact, codec=codec) as snap:
+        progress = TransferProgress("⬆️  push", os.path.getsize(snap.path))
+        process = transport.popen(remote_install_command(None, shlex.quote(remote_path), codec, owner, mode),
+                                  stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        packer = compressor(codec)
+        try:
+            with open(snap.path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    packed = packer.compress(chunk)
+                    process.stdin.write(packed)
+                    progress.update(len(chunk), len(packed))
+            packed = packer.flush()
+            process.stdin.write(packed)
+            progress.update(wire=len(packed))
+            process.stdin.close()
+        except BrokenPipeError:
+            pass  # the remote side exited early; _wait reports why
+        _wait(process, "Remote install")
+    return progress.finish()
+
+
+def pull(transport, remote_path: str, local_path: str, codec: str = DB_SNAPSHOT_CODEC) -> dict:
+    """Stream remote_path compressed into local_path, replacing it once complete"""
+    quoted = shlex.quote(remote_path)
+    # Checkpoint first so the file holds the server's WAL commits. First line
+    # is the size (for progress), then the compressed file
+    process = transport.popen(f"{remote_checkpoint_command(quoted)} && wc -c < {quoted} && "
+                              f"{CODECS[codec]['compress_command']} < {quoted}",
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    staging = f"{local_path}.incoming"
+    try:
+        size_line = process.stdout.readline()
+        progress = TransferProgress("⬇️  pull", int(size_line) if size_line.strip() else None)
+        wire = CountingReader(process.stdout)
+        reader = decompressing_reader(wire, codec)
+        with open(staging, "wb") as out:
+            for data in iter(lambda: reader.read(CHUNK_SIZE), b""):
+                out.write(data)
+                progress.update(len(data), wire.bytes_read - progress.wire_bytes)
+            out.flush()
+            os.fsync(out.fileno())
+        _wait(process, "Remote read")
+        with open(staging, "rb") as f:
+            if f.read(len(SQLITE_HEADER)) != SQLITE_HEADER:
+                raise RuntimeError(f"{remote_path} did not arrive as a SQLite database")
+        if progress.total is not None and os.path.getsize(staging) != progress.total:
+            raise RuntimeError(f"Size mismatch: expected {progress.total} bytes, got {os.path.getsize(staging)}")
+        # Into the existing file, so connections open on it keep working
+        install(staging, local_path)
+    except BaseException:
+        process.kill()
+        process.wait()
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+    return progress.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed streaming database transfer")
+    parser.add_argument("direction", choices=["push", "pull"])
+    parser.add_argument("local_path")
+    parser.add_argument("remote_path")
+    parser.add_argument("--codec", default=DB_SNAPSHOT_CODEC, choices=sorted(CODECS))
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--ssh", metavar="USER@HOST", help="Server to transfer to/from")
+    target.add_argument("--local-process", action="store_true", help="Run the remote side in a local shell")
+    parser.add_argument("--key", default="~/.ssh/hetzni", help="SSH key for --ssh")
+    args = parser.parse_args()
+
+    if args.ssh:
+        user, host = args.ssh.split("@", 1)
+        transport = SSHCommandTransport(user, host, os.path.expanduser(args.key))
+    else:
+        transport = LocalProcessTransport()
+    if args.direction == "push":
+        push(transport, args.local_path, args.remote_path, args.codec)
+    else:
+        pull(transport, args.remote_path, args.local_path, args.codec)
+
+
+if __name__ == "__main__":
+    main()
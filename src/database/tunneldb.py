@@ -12,67 +12,90 @@ import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import argparse
-import hashlib
+
+from change_detector import DatabaseChangeDetector
+from changeset_sync import ChangesetSync, RemotePeer
+from delta_sync import DeltaSync, SSHTransport
+from page_delta import install
+from snapshot import Snapshot, remote_checkpoint_command, remote_install_command
+from ssh_pool import SSHConnectionPool
 
 # Configuration
 SERVER_IP = "178.156.132.116"  # Your server IP
 SSH_KEY_PATH = "~/.ssh/hetzni"
 LOCAL_DB_PATH = "./local_workflows.db"
 SYNC_INTERVAL = 30  # seconds
+DEBOUNCE_SECONDS = 2  # quiet period after the last write before uploading
+MAX_DEBOUNCE_SECONDS = 15  # upload at least this often during a long burst of writes
 
 class DatabaseSyncHandler(FileSystemEventHandler):
+    """Collapses bursts of file events into a single upload"""
+    
     def __init__(self, sync_manager):
         self.sync_manager = sync_manager
-        self.last_upload = 0
-        self.pending_changes = False
+        self.watched = {os.path.abspath(LOCAL_DB_PATH) + suffix for suffix in ("", "-wal", "-journal")}
+        self.lock = threading.Lock()
+        self.timer = None
+        self.first_event = None
     
     def on_modified(self, event):
-        if event.src_path.endswith('.db') and time.time() - self.last_upload > 2: # type: ignore
-            print("🔄 Local database changed, marking for upload...")
-            self.pending_changes = True
-            self.last_upload = time.time()
-            # Upload immediately
-            self.sync_manager.upload_to_server()
-            self.pending_changes = False
+        if os.path.abspath(event.src_path) not in self.watched: # type: ignore
+            return
+        with self.lock:
+            now = time.time()
+            if self.first_event is None:
+                self.first_event = now
+            if self.timer:
+                self.timer.cancel()
+            delay = min(DEBOUNCE_SECONDS, max(0, self.first_event + MAX_DEBOUNCE_SECONDS - now))
+            self.timer = threading.Timer(delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+    
+    def flush(self):
+        with self.lock:
+            self.timer = None
+            self.first_event = None
+        self.sync_manager.push_local_changes()
 
 class DatabaseSyncManager:
-    def __init__(self):
+    def __init__(self, delta=True, changesets=False, compact=False):
         self.ssh_key_path = os.path.expanduser(SSH_KEY_PATH)
+        # One kept-alive connection for every operation instead of a handshake per call
+        self.ssh = SSHConnectionPool(self.create_ssh_client)
+        # Send only changed pages instead of the whole file (falls back to SCP on failure)
+        self.delta = DeltaSync(SSHTransport(self.ssh)) if delta else None
+        # Exchange changed rows of the small tables instead of the file (see changeset_sync.py)
+        self.changesets = changesets
+        # VACUUM INTO a compacted snapshot for full copies
+        self.compact = compact
+        self.row_sync = None
+        # Serialises the watcher and the periodic sync
+        self.sync_lock = threading.RLock()
+        # Detects committed changes without hashing the whole file
+        self.detector = DatabaseChangeDetector(LOCAL_DB_PATH)
         self.running = False
         self.volume_name = None
         self.last_local_hash = None
         self.last_server_hash = None
         
-    def get_file_hash(self, file_path):
-        """Get MD5 hash of a file"""
-        if not os.path.exists(file_path):
-            return None
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+    def get_local_version(self):
+        """Change token of the local database (see change_detector.py)"""
+        return self.detector.token()
     
     def get_server_file_hash(self):
         """Get MD5 hash of the server database file"""
         try:
-            ssh = self.create_ssh_client()
             remote_path = self.get_remote_db_path()
             
-            # Check if remote file exists
-            stdin, stdout, stderr = ssh.exec_command(f"test -f {remote_path} && echo 'exists' || echo 'not found'")
-            result = stdout.read().decode().strip()
-            
-            if result == "not found":
-                ssh.close()
-                return None
+            # Existence check and hash in a single round-trip; commits the app
+            # left in the -wal are checkpointed first so they change the hash
+            status, stdout, stderr = self.ssh.exec(
+                f"test -f {remote_path} && {remote_checkpoint_command(remote_path)} && md5sum {remote_path}"
+            )
+            hash_result = stdout.decode().strip()
             
-            # Get MD5 hash of remote file
-            stdin, stdout, stderr = ssh.exec_command(f"md5sum {remote_path}")
-            hash_result = stdout.read().decode().strip()
-            ssh.close()
-            
-            if hash_result:
+            if status == 0 and hash_result:
                 return hash_result.split()[0]
             return None
             
@@ -95,12 +118,10 @@ class DatabaseSyncManager:
         if self.volume_name:
             return self.volume_name
             
-        ssh = self.create_ssh_client()
-        stdin, stdout, stderr = ssh.exec_command(
+        status, stdout, stderr = self.ssh.exec(
             "docker volume ls --format '{{.Name}}' | grep -E '(database|transcriptai|workflow)'"
         )
-        volumes = stdout.read().decode().strip().split('\n')
-        ssh.close()
+        volumes = stdout.decode().strip().split('\n')
         
         if volumes and volumes[0]:
             self.volume_name = volumes[0]
@@ -116,23 +137,32 @@ class DatabaseSyncManager:
     
     def download_from_server(self):
         """Download database from server to local file"""
+        if self.delta:
+            try:
+                self.delta.download(self.get_remote_db_path(), LOCAL_DB_PATH)
+                return True
+            except FileNotFoundError:
+                print("⚠️  Remote database file not found")
+                return False
+            except Exception as e:
+                print(f"⚠️  Delta download failed ({e}), falling back to full copy")
+        
         try:
-            ssh = self.create_ssh_client()
             remote_path = self.get_remote_db_path()
             
-            # Check if remote file exists
-            stdin, stdout, stderr = ssh.exec_command(f"test -f {remote_path} && echo 'exists' || echo 'not found'")
-            result = stdout.read().decode().strip()
+            # Check if remote file exists, and fold its WAL into it before copying
+            status, stdout, stderr = self.ssh.exec(f"test -f {remote_path} && {remote_checkpoint_command(remote_path)}")
             
-            if result == "not found":
+            if status != 0:
                 print("⚠️  Remote database file not found")
-                ssh.close()
                 return False
             
-            with SCPClient(ssh.get_transport()) as scp: # type: ignore
-                scp.get(remote_path, LOCAL_DB_PATH)
+            # Copy next to the database, then write it into the file TablePlus has open
+            staging = LOCAL_DB_PATH + ".incoming"
+            with SCPClient(self.ssh.transport()) as scp:
+                scp.get(remote_path, staging)
+            install(staging, LOCAL_DB_PATH)
             
-            ssh.close()
             print(f"⬇️  Downloaded database to {LOCAL_DB_PATH}")
             return True
             
@@ -147,17 +177,30 @@ class DatabaseSyncManager:
             return False
             
         try:
-            ssh = self.create_ssh_client()
             remote_path = self.get_remote_db_path()
             
-            with SCPClient(ssh.get_transport()) as scp: # type: ignore  
-                scp.put(LOCAL_DB_PATH, remote_path)
+            uploaded = False
+            # Upload a committed state, never the file mid-transaction. Both paths
+            # stage the new file next to the database and install it (page_delta.install)
+            if self.delta:
+                try:
+                    with Snapshot(LOCAL_DB_PATH) as snap:
+                        self.delta.upload(snap.path, remote_path)
+                    uploaded = True
+                    # An existing file is written in place and keeps its owner; this covers a first upload
+                    self.ssh.exec(f"chown 1000:1000 {remote_path} && chmod 664 {remote_path}")
+                except Exception as e:
+                    print(f"⚠️  Delta upload failed ({e}), falling back to full copy")
             
-            # Fix permissions
-            stdin, stdout, stderr = ssh.exec_command(f"chown 1000:1000 {remote_path}")
-            stdin, stdout, stderr = ssh.exec_command(f"chmod 664 {remote_path}")
+            if not uploaded:
+                with Snapshot(LOCAL_DB_PATH, compact=self.compact) as snap:
+                    compressed = snap.compressed()
+                    remote_compressed = remote_path + os.path.splitext(compressed)[1]
+                    with SCPClient(self.ssh.transport()) as scp:
+                        scp.put(compressed, remote_compressed)
+                # Decompressed next to the database and installed, with its permissions if new
+                self.ssh.run(remote_install_command(remote_compressed, remote_path, snap.codec, "1000:1000", "664"))
             
-            ssh.close()
             print(f"⬆️  Uploaded database to server")
             return True
             
@@ -165,6 +208,46 @@ class DatabaseSyncManager:
             print(f"❌ Upload failed: {e}")
             return False
     
+    def setup_row_sync(self):
+        """Install change capture on the server, then download and track the local copy"""
+        self.row_sync = ChangesetSync(
+            LOCAL_DB_PATH,
+            RemotePeer(SSHTransport(self.ssh), self.get_remote_db_path()),
+        )
+        self.row_sync.install_remote()
+        if not self.download_from_server():
+            return False
+        self.row_sync.init_local()
+        print("🔁 Row-level sync enabled for users, usage_tracking, templates and glossary")
+        return True
+    
+    def sync_rows(self):
+        """Exchange changed rows with the server"""
+        with self.sync_lock:
+            try:
+                self.row_sync.sync()
+                # The sync's own writes aren't local changes
+                self.last_local_hash = self.get_local_version()
+                return True
+            except Exception as e:
+                print(f"❌ Row sync failed: {e}")
+                return False
+    
+    def push_local_changes(self):
+        """Upload once if the database content changed since the last sync"""
+        with self.sync_lock:
+            if self.get_local_version() == self.last_local_hash:
+                # Journal/WAL churn without a commit, or our own download
+                return False
+            print("🔄 Local database changed, uploading...")
+            if self.changesets:
+                return self.sync_rows()
+            if not self.upload_to_server():
+                return False
+            self.last_local_hash = self.get_local_version()
+            self.last_server_hash = self.get_server_file_hash()
+            return True
+    
     def watch_local_changes(self):
         """Watch for local file changes and auto-upload"""
         event_handler = DatabaseSyncHandler(self)
@@ -192,47 +275,56 @@ class DatabaseSyncManager:
                 
             print("🔄 Checking for server changes...")
             
-            # Get current hashes
-            current_local_hash = self.get_file_hash(LOCAL_DB_PATH)
-            current_server_hash = self.get_server_file_hash()
-            
-            if current_server_hash is None:
-                print("⚠️  Could not get server file hash, skipping sync")
+            if self.changesets:
+                self.sync_rows()
                 continue
             
-            # If we have no previous hashes, this is the first sync
-            if self.last_local_hash is None or self.last_server_hash is None:
-                print("📥 First sync - downloading from server...")
-                self.download_from_server()
-                self.last_local_hash = current_local_hash
-                self.last_server_hash = current_server_hash
-                continue
+            with self.sync_lock:
+                self.check_for_changes()
+    
+    def check_for_changes(self):
+        """One periodic sync cycle"""
+        # Get current hashes
+        current_local_hash = self.get_local_version()
+        current_server_hash = self.get_server_file_hash()
+        
+        if current_server_hash is None:
+            print("⚠️  Could not get server file hash, skipping sync")
+            return
+        
+        # If we have no previous hashes, this is the first sync
+        if self.last_local_hash is None or self.last_server_hash is None:
+            print("📥 First sync - downloading from server...")
+            self.download_from_server()
+            self.last_local_hash = current_local_hash
+            self.last_server_hash = current_server_hash
+            return
+        
+        # Check if local has changed since our last sync
+        if current_local_hash != self.last_local_hash:
+            print("🔄 Local database has changed, uploading to server...")
+            self.upload_to_server()
+            self.last_local_hash = current_local_hash
+            self.last_server_hash = self.get_server_file_hash()
+            return
+        
+        # Check if server has changed since our last sync
+        if current_server_hash != self.last_server_hash:
+            print("🔄 Server database has changed")
             
-            # Check if local has changed since our last sync
+            # Check if local has also changed since our last sync
             if current_local_hash != self.last_local_hash:
-                print("🔄 Local database has changed, uploading to server...")
+                print("⚠️  Both local and server have changed - uploading local changes to server...")
                 self.upload_to_server()
                 self.last_local_hash = current_local_hash
                 self.last_server_hash = self.get_server_file_hash()
-                continue
-            
-            # Check if server has changed since our last sync
-            if current_server_hash != self.last_server_hash:
-                print("🔄 Server database has changed")
-                
-                # Check if local has also changed since our last sync
-                if current_local_hash != self.last_local_hash:
-                    print("⚠️  Both local and server have changed - uploading local changes to server...")
-                    self.upload_to_server()
-                    self.last_local_hash = current_local_hash
-                    self.last_server_hash = self.get_server_file_hash()
-                else:
-                    print("📥 Server changed, downloading updates...")
-                    self.download_from_server()
-                    self.last_local_hash = self.get_file_hash(LOCAL_DB_PATH)
-                    self.last_server_hash = current_server_hash
             else:
-                print("✅ No changes detected")
+                print("📥 Server changed, downloading updates...")
+                self.download_from_server()
+                self.last_local_hash = self.get_local_version()
+                self.last_server_hash = current_server_hash
+        else:
+            print("✅ No changes detected")
     
     def start_sync(self, watch_changes=True, periodic_sync=True):
         """Start the sync process"""
@@ -241,11 +333,19 @@ class DatabaseSyncManager:
         print(f"📁 Local DB: {LOCAL_DB_PATH}")
         
         # Initial download
-        if not self.download_from_server():
+        if self.changesets:
+            try:
+                if not self.setup_row_sync():
+                    print("❌ Initial download failed, row sync needs a local copy")
+                    return
+            except Exception as e:
+                print(f"❌ Row sync setup failed: {e}")
+                return
+        elif not self.download_from_server():
             print("⚠️  Initial download failed, but continuing...")
         
         # Initialize hash tracking
-        self.last_local_hash = self.get_file_hash(LOCAL_DB_PATH)
+        self.last_local_hash = self.get_local_version()
         self.last_server_hash = self.get_server_file_hash()
         
         self.running = True
@@ -280,6 +380,8 @@ class DatabaseSyncManager:
             
             for thread in threads:
                 thread.join(timeout=2)
+            self.ssh.close()
+            self.detector.close()
 
 def main():
     parser = argparse.ArgumentParser(description="Database sync for TablePlus")
@@ -287,10 +389,13 @@ def main():
     parser.add_argument("--upload-only", action="store_true", help="Just upload once and exit")
     parser.add_argument("--no-watch", action="store_true", help="Don't watch for local changes")
     parser.add_argument("--no-periodic", action="store_true", help="Don't periodically sync from server")
+    parser.add_argument("--full-copy", action="store_true", help="Copy the whole file over SCP instead of changed pages")
+    parser.add_argument("--changesets", action="store_true", help="Sync changed rows of users, usage, templates and glossary instead of the file")
+    parser.add_argument("--compact", action="store_true", help="VACUUM the snapshot before a full copy")
     
     args = parser.parse_args()
     
-    sync_manager = DatabaseSyncManager()
+    sync_manager = DatabaseSyncManager(delta=not args.full_copy, changesets=args.changesets, compact=args.compact)
     
     if args.download_only:
         sync_manager.download_from_server()
@@ -1,12 +1,11 @@
-from typing import List
 from langchain_chroma import Chroma
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain_core.documents import Document
 from chonkie import CodeChunker, RecursiveChunker, SemanticChunker
-from rapidfuzz import fuzz
 import os
 
 from .pythoncodeparser import PythonCodeParser
+from .contenttype import classify_batch
 
 class ChonkieStore:
     """Manages a Chroma vector store for code chunks and similarity searches."""
@@ -47,12 +46,13 @@ class ChonkieStore:
             if not self._is_similar_content(s['content'])
         ]
         
+        content_types = classify_batch([s['content'] for s in unique_sentences])
         documents = [
             Document(
                 page_content=s['content'].strip(),
-                metadata={"type": self._detect_content_type(s['content'])}
+                metadata={"type": content_type}
             )
-            for s in unique_sentences
+            for s, content_type in zip(unique_sentences, content_types)
         ]
         print("documents", documents)
         
@@ -63,23 +63,3 @@ class ChonkieStore:
         """Check if content is similar to existing documents."""
         similar_docs = self.vector_store.similarity_search_with_score(content, k=2)
         return any(score < threshold for _, score in similar_docs)
-
-    def _score_keywords(self, keywords: List[str], text: str) -> float:
-        """Calculate maximum similarity score for keywords against text."""
-        return max(fuzz.token_set_ratio(k, text) for k in keywords)
-
-    def _detect_content_type(self, text: str) -> str:
-        """Determine if text is Python, SQL, or plain text based on keyword scores."""
-        text = text.strip().lower()
-        
-        PYTHON_KEYWORDS = ['def', 'import', 'return', 'print', 'lambda', 'class', '#']
-        SQL_KEYWORDS = ['select', 'from', 'where', 'insert', 'update', 'delete', '--', 'join']
-        
-        python_score = self._score_keywords(PYTHON_KEYWORDS, text)
-        sql_score = self._score_keywords(SQL_KEYWORDS, text)
-        
-        max_score = max(python_score, sql_score)
-        
-        if max_score < 60:
-            return "text"
-        return "python" if python_score > sql_score else "sql"
\ No newline at end of file
@@ -0,0 +1,158 @@
+import resource
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Embedding model chonkie's SemanticChunker uses when none is given
+DEFAULT_EMBEDDING_MODEL = "minishlab/potion-base-8M"
+
+ChunkerKey = Tuple[float, int, Tuple[str, ...], str, int]
+
+_lock = threading.Lock()
+_key_locks: Dict[Any, threading.Lock] = {}
+_chunkers: Dict[ChunkerKey, Any] = {}
+_embeddings: Dict[str, Any] = {}
+_stats: Dict[Any, Dict[str, Any]] = {}
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _key_lock(key: Any) -> threading.Lock:
+    with _lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _load(key: Any, factory) -> Any:
+    """Run factory once per key, recording load time and memory growth."""
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    value = factory()
+    with _lock:
+        _stats[key] = {
+            "load_seconds": time.perf_counter() - start,
+            "peak_rss_delta_mb": _peak_rss_mb() - rss_before,
+            "hits": 0,
+        }
+    return value
+
+
+def _hit(key: Any) -> None:
+    # += on a shared dict isn't atomic; concurrent callers would lose counts
+    with _lock:
+        _stats[key]["hits"] += 1
+
+
+def _get_embeddings(model: str) -> Any:
+    """Load an embedding model once per process and share it between chunkers."""
+    key = ("embeddings", model)
+    if model not in _embeddings:
+        with _key_lock(key):
+            if model not in _embeddings:
+                from chonkie import AutoEmbeddings
+                _embeddings[model] = _load(key, lambda: AutoEmbeddings.get_embeddings(model))
+                return _embeddings[model]
+    _hit(key)
+    return _embeddings[model]
+
+
+def get_chunker(
+    threshold: float = 0.5,
+    chunk_size: int = 512,
+    delim: Sequence[str] = ("\n\n", "\n"),
+    model: str = DEFAULT_EMBEDDING_MODEL,
+    min_sentences: int = 1,
+):
+    """
+    Return the process-wide SemanticChunker for a configuration, building it on first use.
+
+    Chunkers are cached per (threshold, chunk_size, delim, model, min_sentences)
+    and chunkers with different settings but the same model share one loaded
+    embedding model, so repeated callers only pay the model load once.
+
+    Args:
+        threshold: Similarity threshold passed to SemanticChunker
+        chunk_size: Maximum tokens per chunk
+        delim: Sentence delimiters
+        model: Embedding model name
+        min_sentences: Initial sentences per chunk
+
+    Returns:
+        A shared SemanticChunker instance
+    """
+    key: ChunkerKey = (threshold, chunk_size, tuple(delim), model, min_sentences)
+    chunker = _chunkers.get(key)
+    if chunker is None:
+        with _key_lock(key):
+            chunker = _chunkers.get(key)
+            if chunker is None:
+                from chonkie import SemanticChunker
+                embeddings = _get_embeddings(model)
+                chunker = _load(key, lambda: SemanticChunker(
+                    embedding_model=embeddings,
+                    threshold=threshold,
+                    chunk_size=chunk_size,
+                    min_sentences=min_sentences,
+                    delim=list(delim),
+                ))
+                _chunkers[key] = chunker
+                return chunker
+    _hit(key)
+    return chunker
+
+
+def warm_chunkers(configs: Iterable[Dict[str, Any]]) -> None:
+    """
+    Build chunkers ahead of time, e.g. at server startup.
+
+    Args:
+        configs: Keyword arguments for get_chunker, one dict per chunker
+    """
+    for config in configs:
+        get_chunker(**config)
+
+
+def chunker_stats() -> Dict[str, Any]:
+    """
+    Report what the registry holds and what it cost to load.
+
+    Returns:
+        Dict with the process peak RSS and one entry per loaded model/chunker
+    """
+    entries: List[Dict[str, Any]] = []
+    with _lock:
+        snapshot = [(key, dict(stats)) for key, stats in _stats.items()]
+    for key, stats in snapshot:
+        if key[0] == "embeddings":
+            entries.append({"kind": "embeddings", "model": key[1], **stats})
+        else:
+            threshold, chunk_size, delim, model, min_sentences = key
+            entries.append({
+                "kind": "chunker",
+                "model": model,
+                "threshold": threshold,
+                "chunk_size": chunk_size,
+                "delim": list(delim),
+                "min_sentences": min_sentences,
+                **stats,
+            })
+    return {"peak_rss_mb": _peak_rss_mb(), "entries": entries}
+
+
+def print_chunker_stats(stats: Optional[Dict[str, Any]] = None) -> None:
+    """Print chunker_stats() in a readable form."""
+    stats = stats or chunker_stats()
+    print(f"📊 Chunker registry (process peak RSS {stats['peak_rss_mb']:.0f} MB)")
+    for entry in stats["entries"]:
+        label = entry["model"] if entry["kind"] == "embeddings" else (
+            f"threshold={entry['threshold']} chunk_size={entry['chunk_size']}"
+        )
+        print(
+            f"   {entry['kind']:<10} {label:<45} "
+            f"load={entry['load_seconds']:.2f}s +{entry['peak_rss_delta_mb']:.0f} MB hits={entry['hits']}"
+        )
@@ -0,0 +1,102 @@
+from typing import Dict, Iterator, List, Optional
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+
+class ChunkReader:
+    """
+    Reads chunks from a Chroma store by id or metadata filter.
+    Goes straight to the collection's get(), so no embeddings are computed
+    and results are not capped by a similarity-search k.
+    """
+
+    def __init__(self, rag_store: Chroma, page_size: int = 500):
+        """
+        Args:
+            rag_store: The Chroma vector store to read from
+            page_size: Number of chunks fetched per round-trip when paging
+        """
+        self.rag_store = rag_store
+        self.page_size = page_size
+
+    def _to_documents(self, result: Dict) -> List[Document]:
+        """Convert a raw Chroma get() result into LangChain documents."""
+        documents = []
+        for chunk_id, text, metadata in zip(
+            result["ids"], result["documents"], result["metadatas"]
+        ):
+            documents.append(
+                Document(id=chunk_id, page_content=text, metadata=metadata or {})
+            )
+        return documents
+
+    def get_by_id(self, chunk_id: str) -> Optional[Document]:
+        """
+        Fetch a single chunk by its Chroma id.
+
+        Args:
+            chunk_id: The UUID the chunk was stored under
+
+        Returns:
+            The document if found, None otherwise
+        """
+        result = self.rag_store.get(ids=[chunk_id], include=["documents", "metadatas"])
+        documents = self._to_documents(result)
+        return documents[0] if documents else None
+
+    def iter_pages(
+        self, where: Optional[Dict] = None, include_text: bool = True
+    ) -> Iterator[List[Document]]:
+        """
+        Page through every chunk matching a metadata filter.
+
+        Each page is fetched with limit/offset, so only one page is held in
+        memory at a time regardless of the collection size. Chroma skips the
+        offset rows on every call, so reading a whole large collection this
+        way is O(n²) in the number of chunks; use a where filter to narrow it.
+
+        Args:
+            where: Optional Chroma metadata filter, e.g. {"source": "code_chunk"}
+            include_text: Set to False to only fetch ids and metadata
+
+        Yields:
+            Lists of at most page_size documents
+        """
+        include = ["documents", "metadatas"] if include_text else ["metadatas"]
+        offset = 0
+        while True:
+            result = self.rag_store.get(
+                where=where, limit=self.page_size, offset=offset, include=include
+            )
+            if not result["ids"]:
+                return
+            if not include_text:
+                result["documents"] = [""] * len(result["ids"])
+            yield self._to_documents(result)
+            if len(result["ids"]) < self.page_size:
+                return
+            offset += len(result["ids"])
+
+    def iter_chunks(
+        self, where: Optional[Dict] = None, include_text: bool = True
+    ) -> Iterator[Document]:
+        """
+        Stream every chunk matching a metadata filter one document at a time.
+
+        Args:
+            where: Optional Chroma metadata filter
+            include_text: Set to False to only fetch ids and metadata
+
+        Yields:
+            Documents in collection order
+        """
+        for page in self.iter_pages(where=where, include_text=include_text):
+            yield from page
+
+    def count(self, where: Optional[Dict] = None) -> int:
+        """
+        Count chunks matching a metadata filter.
+
+        One get() that returns only ids, so no text, metadata or paging.
+        """
+        return len(self.rag_store.get(where=where, include=[])["ids"])
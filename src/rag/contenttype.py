@@ -0,0 +1,117 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# Keywords for detection
+PYTHON_KEYWORDS = ['def', 'import', 'return', 'print', 'lambda', 'class', '#']
+SQL_KEYWORDS = ['select', 'from', 'where', 'insert', 'update', 'delete', '--', 'join']
+
+# Pygments guesses that are known to be wrong for our content
+PYGMENTS_MISDETECTION_FIXES = {
+    'teratermmacro': 'python',
+    'gdscript': 'javascript',
+}
+
+
+def pygments_language(text: str) -> str:
+    """Detect programming language using Pygments with misdetection fixes."""
+    from pygments.lexers import guess_lexer
+    from pygments.util import ClassNotFound
+
+    try:
+        lexer = guess_lexer(text)
+    except ClassNotFound:
+        return "text"
+    language = lexer.aliases[0] if lexer.aliases else lexer.name.lower()
+    return PYGMENTS_MISDETECTION_FIXES.get(language, language) or "text"
+
+
+class ContentTypeClassifier:
+    """
+    Labels chunks as python, sql or text by fuzzy keyword matching.
+
+    All keywords are scored against all chunks in a single rapidfuzz cdist
+    call, which runs in C across every core instead of one Python-level
+    token_set_ratio call per keyword per chunk.
+    """
+
+    def __init__(
+        self,
+        keywords: Optional[Dict[str, Sequence[str]]] = None,
+        min_score: float = 60,
+        fallback: Optional[Callable[[str], str]] = None,
+    ):
+        """
+        Args:
+            keywords: Label -> keywords; later labels win ties
+            min_score: Best keyword score below which a chunk is plain text
+            fallback: Optional detector (e.g. pygments_language) for chunks
+                that no keyword list matched
+        """
+        keywords = keywords or {"python": PYTHON_KEYWORDS, "sql": SQL_KEYWORDS}
+        self.labels = list(keywords)
+        self.min_score = min_score
+        self.fallback = fallback
+
+        # Flatten keywords and remember which label each row of the score matrix belongs to
+        self.keywords: List[str] = []
+        self._label_slices: List[Tuple[int, int]] = []
+        for label in self.labels:
+            start = len(self.keywords)
+            self.keywords.extend(keywords[label])
+            self._label_slices.append((start, len(self.keywords)))
+
+    def score_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Score every label against every text.
+
+        Returns:
+            Array of shape (len(labels), len(texts)) with the best keyword score per label
+        """
+        cleaned = [text.strip().lower() for text in texts]
+        scores = process.cdist(self.keywords, cleaned, scorer=fuzz.token_set_ratio, workers=-1)
+        return np.stack([scores[start:end].max(axis=0) for start, end in self._label_slices])
+
+    def classify_batch(self, texts: Sequence[str]) -> List[str]:
+        """
+        Label many texts at once.
+
+        Args:
+            texts: Chunks to classify
+
+        Returns:
+            One label per text: a keyword label, "text", or the fallback's answer
+        """
+        if not texts:
+            return []
+        scores = self.score_batch(texts)
+        # Ties go to the later label, matching the old "python if > else sql" rule
+        best = len(self.labels) - 1 - scores[::-1].argmax(axis=0)
+        labels = np.array(self.labels, dtype=object)[best]
+        is_text = scores.max(axis=0) < self.min_score
+        labels[is_text] = "text"
+
+        result = labels.tolist()
+        if self.fallback:
+            for i in np.flatnonzero(is_text):
+                result[i] = self.fallback(texts[i]) or "text"
+        return result
+
+    def classify(self, text: str) -> str:
+        """Label a single text."""
+        return self.classify_batch([text])[0]
+
+
+# Shared default classifier, keywords only
+default_classifier = ContentTypeClassifier()
+
+
+def classify_batch(texts: Sequence[str]) -> List[str]:
+    """Label many texts as python, sql or text with the default classifier."""
+    return default_classifier.classify_batch(texts)
+
+
+def detect_content_type(text: str) -> str:
+    """Label a single text as python, sql or text with the default classifier."""
+    return default_classifier.classify(text)
@@ -3,7 +3,7 @@ import sys
 import os
 
 from .vectorstore import VectorStoreManager
-from .graph import RAGGraph
+from .summarizer import HierarchicalSummarizer, SummaryCache
 from langchain_ollama import ChatOllama
 
 
@@ -13,26 +13,22 @@ def main():
     """Main execution function"""
     # Initialize vector store manager
     vector_store_manager = VectorStoreManager()
-    
 
-    # Get all docs from the database
-    docs = vector_store_manager.rag_store.get(include=["documents"])
-
-    # for doc in docs['documents']:
-    #     print("doc", doc[0:20])
-    #     print("-"*100)
-
-    for doc in docs["ids"]:
-        print("doc", doc[0:20])
-        print("-"*100)
-
-    docs_str = "\n".join([doc for doc in docs['documents']])
+    # Stream docs from the database page by page instead of loading them all
+    docs = (doc.page_content for doc in vector_store_manager.chunk_reader.iter_chunks())
 
     llm = ChatOllama(model="gemma3:12b")
-    # response = llm.invoke(f"You have to create a summary of the following text: {docs_str}")
-    # print("response", response)
+    summarizer = HierarchicalSummarizer(
+        llm,
+        cache=SummaryCache("./summary_cache"),
+        token_budget=3000,
+        max_workers=4,
+    )
+
+    response = summarizer.summarize(docs)
+    print("response", response)
 
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,10 +1,94 @@
 import ast
+import os
 import re
 import tokenize
-import io
-from typing import List, Dict, Any
-from chonkie import SemanticChunker
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import List, Dict, Any, Iterable, Optional
 
+from .chunkerregistry import get_chunker
+
+MARKDOWN_TABLE_ROW = re.compile(r'^\s*\|.*\|\s*$')
+MARKDOWN_TABLE_RULE = re.compile(r'^\s*[\|\-\s]+\s*$')
+OPEN_BRACKETS = "([{"
+CLOSE_BRACKETS = ")]}"
+# Keywords that only start a statement, so never appear inside brackets
+STATEMENT_KEYWORDS = frozenset((
+    "assert", "break", "class", "continue", "def", "del", "elif", "except", "finally",
+    "global", "import", "nonlocal", "pass", "raise", "return", "try", "while", "with",
+))
+# Lines a bracket may stay open before it's taken as unclosed; bounds each resume
+MAX_BRACKET_LINES = 1000
+
+
+def find_invalid_lines(lines: List[str]) -> List[int]:
+    """
+    Return the indexes of lines that keep the text from tokenizing as Python.
+
+    Tokenizes forward and, on an error, uses the tokenizer's position and the
+    open brackets seen so far to blame a single line; a close bracket with
+    nothing open is blamed on its own line. Tokenizing resumes on the
+    line after it with the current indentation levels replayed, so lines that
+    already passed are never tokenized again.
+
+    An unclosed bracket is caught at the first statement keyword after it,
+    or once it has been open for MAX_BRACKET_LINES, instead of at EOF, so
+    each error re-tokenizes a bounded window and error-dense text stays
+    linear.
+
+    Args:
+        lines: Source lines, each ending with a newline
+    """
+    invalid = []
+    pos = 0
+    indents = [""]
+    while pos < len(lines):
+        # Replay the indentation stack so resuming inside a block doesn't dedent-fail
+        prefix = [indent + "pass\n" for indent in indents]
+        offset = pos - len(prefix)
+        readline = chain(prefix, islice(lines, pos, None)).__next__
+        stmt_start = pos
+        open_rows = []
+        bad = None
+        try:
+            for tok in tokenize.generate_tokens(readline):
+                row = offset + tok.start[0] - 1
+                if row < pos:
+                    continue  # replayed prefix
+                if open_rows and (row - open_rows[0] > MAX_BRACKET_LINES or
+                                  (tok.type == tokenize.NAME and tok.string in STATEMENT_KEYWORDS)):
+                    bad = open_rows[0]
+                    break
+                if tok.type == tokenize.INDENT:
+                    indents.append(tok.string)
+                elif tok.type == tokenize.DEDENT:
+                    indents.pop()
+                elif tok.type == tokenize.NEWLINE or (tok.type == tokenize.NL and not open_rows):
+                    stmt_start = row + 1
+                elif tok.type == tokenize.OP and tok.string in OPEN_BRACKETS:
+                    open_rows.append(row)
+                elif tok.type == tokenize.OP and tok.string in CLOSE_BRACKETS:
+                    if not open_rows:
+                        # A stray close bracket tokenizes (or only fails at EOF) but never parses
+                        bad = row
+                        break
+                    open_rows.pop()
+            if bad is None:
+                return invalid
+        except IndentationError as e:
+            bad = offset + (e.lineno or 1) - 1
+        except (tokenize.TokenError, SyntaxError) as e:
+            if open_rows:
+                bad = open_rows[0]
+            elif len(e.args) > 1 and isinstance(e.args[1], tuple):
+                bad = offset + e.args[1][0] - 1
+            else:
+                bad = stmt_start
+        # Never blame a line that was already accepted or lies past the end
+        bad = min(max(bad, stmt_start, pos), len(lines) - 1)
+        invalid.append(bad)
+        pos = bad + 1
+    return invalid
 
 
 class PythonCodeParser:
@@ -13,14 +97,11 @@ class PythonCodeParser:
     def __init__(self, mixed_text: str):
         self.python_code, self.ignored_content = self._extract_python_code(mixed_text)
         self.source_lines = self.python_code.splitlines()
-        
-        # Initialize semantic chunker
-        self.chunker = SemanticChunker(
-            threshold=0.5,
-            chunk_size=512,
-            min_sentences=1,
-            delim=["\n\n", "\n"]
-        )
+
+    @property
+    def chunker(self):
+        """Semantic chunker, loaded lazily and shared by every parser in the process."""
+        return get_chunker(threshold=0.5, chunk_size=512, delim=["\n\n", "\n"])
     
     def _extract_python_code(self, text: str) -> tuple[str, str]:
         """Extract valid Python code and return ignored content separately."""
@@ -30,34 +111,20 @@ class PythonCodeParser:
         
         # Filter out markdown tables and invalid syntax
         for line in lines:
-            if re.match(r'^\s*\|.*\|\s*$', line) or re.match(r'^\s*[\|\-\s]+\s*$', line):
+            if MARKDOWN_TABLE_ROW.match(line) or MARKDOWN_TABLE_RULE.match(line):
                 ignored_lines.append(line)
                 continue
             valid_lines.append(line)
         
-        clean_text = '\n'.join(valid_lines)
-        
-        # Validate using tokenizer
-        try:
-            list(tokenize.generate_tokens(io.StringIO(clean_text).readline))
-            return clean_text, '\n'.join(ignored_lines)
-        except tokenize.TokenError:
-            # Line-by-line validation
-            python_lines = []
-            invalid_lines = []
-            
-            for line in valid_lines:
-                if not line.strip():
-                    python_lines.append(line)
-                    continue
-                try:
-                    list(tokenize.generate_tokens(io.StringIO(line).readline))
-                    python_lines.append(line)
-                except (tokenize.TokenError, IndentationError):
-                    invalid_lines.append(line)
-            
-            all_ignored = ignored_lines + invalid_lines
-            return '\n'.join(python_lines), '\n'.join(all_ignored)
+        # Validate using tokenizer, dropping only the lines it blames
+        invalid = set(find_invalid_lines([line + '\n' for line in valid_lines]))
+        if not invalid:
+            return '\n'.join(valid_lines), '\n'.join(ignored_lines)
+
+        python_lines = [line for i, line in enumerate(valid_lines) if i not in invalid]
+        invalid_lines = [line for i, line in enumerate(valid_lines) if i in invalid]
+        all_ignored = ignored_lines + invalid_lines
+        return '\n'.join(python_lines), '\n'.join(all_ignored)
     
     def _extract_code_block(self, node: Any) -> str:
         """Extract code block for a given AST node."""
@@ -127,3 +194,46 @@ class PythonCodeParser:
                 })
         
         return chunks
+
+
+def _parse_file(path: str, chunk: bool) -> Dict[str, Any]:
+    """Parse one file in a worker process."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        parser = PythonCodeParser(f.read())
+    error = None
+    try:
+        functions_classes, remaining_code = parser.extract_functions_and_classes()
+    except SyntaxError as e:
+        # Prose can tokenize as Python but still fail to parse
+        functions_classes, remaining_code, error = [], parser.python_code, str(e)
+    return {
+        'path': path,
+        'error': error,
+        'python_code': parser.python_code,
+        'ignored_content': parser.ignored_content,
+        'functions_classes': functions_classes,
+        'remaining_code': remaining_code,
+        'chunks': parser.create_all_chunks() if chunk and error is None else None,
+    }
+
+
+def parse_many(files: Iterable[str], max_workers: Optional[int] = None, chunk: bool = False) -> List[Dict[str, Any]]:
+    """
+    Parse many files in parallel using a process pool.
+
+    Args:
+        files: Paths of the markdown/Python files to parse
+        max_workers: Number of worker processes (defaults to the CPU count)
+        chunk: Also run semantic chunking; each worker then loads the model once
+
+    Returns:
+        One result dict per file, in input order
+    """
+    files = list(files)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(files) < 2:
+        return [_parse_file(path, chunk) for path in files]
+
+    chunksize = max(1, len(files) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_parse_file, files, [chunk] * len(files), chunksize=chunksize))
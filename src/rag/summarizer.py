@@ -0,0 +1,221 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional
+import hashlib
+from itertools import islice
+import os
+import tempfile
+
+from langchain_core.language_models import BaseChatModel
+
+MAP_PROMPT = "You have to create a summary of the following text:\n\n{text}"
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive parts of a larger document. "
+    "Combine them into a single coherent summary:\n\n{text}"
+)
+SEPARATOR = "\n\n"
+
+
+def approx_token_count(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for budgeting groups."""
+    return len(text) // 4 + 1
+
+
+class SummaryCache:
+    """Stores partial summaries on disk, one file per content hash."""
+
+    def __init__(self, cache_dir: str = "./summary_cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def set(self, key: str, summary: str) -> None:
+        # Write to a temp file first so a crash never leaves a partial entry; a
+        # unique one, as identical prompts in flight at once write the same key
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{key}-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(summary)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class HierarchicalSummarizer:
+    """
+    Map-reduce summarizer for inputs that do not fit in one prompt.
+
+    Texts are packed into groups that fit a token budget and summarized
+    concurrently (map). The partial summaries are then packed and summarized
+    again until a single summary remains (reduce). Every partial is cached by
+    the hash of its prompt and model, so a re-run after a small change only
+    re-summarizes the groups whose text changed and the reduce steps above them.
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        cache: Optional[SummaryCache] = None,
+        token_budget: int = 3000,
+        max_workers: int = 4,
+        count_tokens: Callable[[str], int] = approx_token_count,
+        model_name: str = "",
+        boundary_every: int = 8,
+    ):
+        """
+        Args:
+            llm: Chat model used for both map and reduce prompts
+            cache: Optional on-disk cache for partial summaries
+            token_budget: Maximum estimated tokens of input text per LLM call
+            max_workers: Number of concurrent LLM calls
+            count_tokens: Function used to estimate the token size of a text
+            model_name: Included in cache keys so switching models invalidates them
+            boundary_every: Average number of texts per group between content-defined cuts
+        """
+        self.llm = llm
+        self.cache = cache
+        self.token_budget = token_budget
+        self.max_workers = max_workers
+        self.count_tokens = count_tokens
+        self.model_name = model_name or getattr(llm, "model", "")
+        self.boundary_every = boundary_every
+
+    def _is_boundary(self, text: str) -> bool:
+        """Content-defined cut point, independent of the texts around it."""
+        digest = hashlib.sha256(text.encode()).digest()
+        return int.from_bytes(digest[:4], "big") % self.boundary_every == 0
+
+    def _split(self, text: str) -> List[str]:
+        """
+        Cut a text over the token budget into consecutive pieces that fit it,
+        preferring whitespace as the cut point. Texts within budget are
+        returned as they are.
+        """
+        tokens = self.count_tokens(text)
+        if tokens <= self.token_budget or len(text) < 2:
+            return [text]
+        size = -(-len(text) // -(-tokens // self.token_budget))
+        pieces: List[str] = []
+        start = 0
+        while start < len(text):
+            end = min(start + size, len(text))
+            if end < len(text):
+                cut = max(text.rfind("\n", start + size // 2, end), text.rfind(" ", start + size // 2, end))
+                if cut > start:
+                    end = cut + 1
+            # count_tokens is pluggable, so a piece can still be over; split it again
+            pieces.extend(self._split(text[start:end]))
+            start = end
+        return pieces
+
+    def _group(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        """
+        Pack consecutive texts into groups that stay under the token budget.
+
+        Texts over the budget are split into pieces first, so nothing is
+        dropped. Groups also end after any text whose hash marks a boundary,
+        so inserting or editing one text only changes the group around it
+        instead of shifting every later group (and invalidating all their
+        cached summaries).
+        """
+        group: List[str] = []
+        group_tokens = 0
+        for text in (piece for text in texts for piece in self._split(text)):
+            tokens = self.count_tokens(text)
+            if group and group_tokens + tokens > self.token_budget:
+                yield group
+                group, group_tokens = [], 0
+            group.append(text)
+            group_tokens += tokens
+            if self._is_boundary(text):
+                yield group
+                group, group_tokens = [], 0
+        if group:
+            yield group
+
+    def _summarize(self, prompt: str) -> str:
+        """Summarize one prompt, going through the cache when one is configured."""
+        key = hashlib.sha256(f"{self.model_name}\0{prompt}".encode()).hexdigest()
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = self.llm.invoke(prompt)
+        summary = str(getattr(response, "content", response)).strip()
+
+        if self.cache:
+            self.cache.set(key, summary)
+        return summary
+
+    def _run_level(self, groups: Iterable[List[str]], template: str) -> List[str]:
+        """
+        Summarize every group of one tree level concurrently, keeping order.
+
+        Groups are pulled from the iterator a window at a time, so only a few
+        groups of source text are in memory while the LLM calls run.
+        """
+        groups = iter(groups)
+        summaries: List[str] = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                window = list(islice(groups, self.max_workers * 2))
+                if not window:
+                    break
+                prompts = [template.format(text=SEPARATOR.join(g)) for g in window]
+                summaries.extend(executor.map(self._summarize, prompts))
+        return summaries
+
+    def summarize(self, texts: Iterable[str]) -> str:
+        """
+        Summarize a stream of texts into one summary.
+
+        Args:
+            texts: Texts in document order; may be a lazy iterator
+
+        Returns:
+            The final summary, or an empty string when there is no input
+        """
+        summaries = self._run_level(self._group(texts), MAP_PROMPT)
+        level = 1
+        while len(summaries) > 1:
+            print(f"Reducing {len(summaries)} partial summaries (level {level})")
+            groups = list(self._group(summaries))
+            if len(groups) >= len(summaries):
+                # Boundaries (or sheer size) left every summary alone; pair up the
+                # neighbours that fit together, and re-summarize the rest on their
+                # own so they shrink enough to be paired on the next level
+                groups = self._pair(summaries)
+            count_before, tokens_before = len(summaries), sum(map(self.count_tokens, summaries))
+            summaries = self._run_level(groups, REDUCE_PROMPT)
+            if len(summaries) >= count_before and sum(map(self.count_tokens, summaries)) >= tokens_before:
+                raise RuntimeError(
+                    f"Partial summaries stopped shrinking at level {level}; "
+                    f"token_budget={self.token_budget} is too small for the model's summaries"
+                )
+            level += 1
+        return summaries[0] if summaries else ""
+
+    def _pair(self, summaries: List[str]) -> List[List[str]]:
+        """Groups of two neighbouring summaries where they fit the budget together, else one."""
+        groups: List[List[str]] = []
+        i = 0
+        while i < len(summaries):
+            if (i + 1 < len(summaries)
+                    and self.count_tokens(summaries[i]) + self.count_tokens(summaries[i + 1]) <= self.token_budget):
+                groups.append(summaries[i:i + 2])
+                i += 2
+            else:
+                groups.extend([piece] for piece in self._split(summaries[i]))
+                i += 1
+        return groups
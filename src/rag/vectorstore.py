@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Iterator, Optional, List
 from langchain_chroma import Chroma
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain_core.documents import Document
@@ -7,6 +7,8 @@ import os
 from uuid import uuid4
 import sys
 
+from .chunkreader import ChunkReader
+
 class VectorStoreManager:
     """
     Manages a Chroma vector store for code chunks and similarity search.
@@ -32,6 +34,9 @@ class VectorStoreManager:
             embedding_function=self.embedding,
             persist_directory=self.chroma_db_path
         )
+
+        # Direct id/metadata reads that bypass the embedding model
+        self.chunk_reader = ChunkReader(self.rag_store)
     
     def setup_code_chunks(self, code: str):
         """
@@ -175,9 +180,31 @@ class VectorStoreManager:
         Returns:
             List of all documents with the specified source
         """
-        # This is a simple approach - in practice you might want to use
-        # the underlying Chroma client for more complex queries
-        return self.rag_store.similarity_search("", k=1000, filter={"source": source})
+        return list(self.iter_chunks_by_source(source))
+
+    def iter_chunks_by_source(self, source: str = "code_chunk") -> Iterator[Document]:
+        """
+        Stream all chunks of a specific source type page by page.
+        
+        Args:
+            source: Source filter to apply
+            
+        Yields:
+            Documents with the specified source
+        """
+        return self.chunk_reader.iter_chunks(where={"source": source})
+
+    def count(self, source: Optional[str] = None) -> int:
+        """
+        Count the chunks in the store.
+        
+        Args:
+            source: Only count chunks with this source, e.g. "code_chunk"
+            
+        Returns:
+            Number of stored chunks
+        """
+        return self.chunk_reader.count(where={"source": source} if source else None)
 
     def get_chunk_by_id(self, chunk_id: str):
         """
@@ -190,13 +217,7 @@ class VectorStoreManager:
             The document if found, None otherwise
         """
         try:
-            # Search with a filter for the specific chunk_id
-            results = self.rag_store.similarity_search(
-                "", 
-                k=1, 
-                filter={"chunk_id": chunk_id}
-            )
-            return results[0] if results else None
+            return self.chunk_reader.get_by_id(chunk_id)
         except Exception as e:
             print(f"Error retrieving chunk {chunk_id}: {e}")
             return None
@@ -0,0 +1,77 @@
+"""
+Measure the per-event cost of turning graph events into SSE bytes.
+
+Compares the old path (isoformat timestamp, json.dumps, f-string frame,
+one str write per event) with the serializer layer (datetime encoded by the
+serializer, bytes frames, bursts coalesced into one write), for both the
+json fallback and orjson when it is installed.
+
+Run from the streaming directory:
+    python benchmark_serializer.py --events 100000 --burst 10
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+from serializer import get_serializer, orjson, sse_frame
+
+
+def make_event(i: int, timestamp) -> dict:
+    """A typical state patch event"""
+    return {
+        "type": "state_patch",
+        "node_name": f"node{i % 5}",
+        "patch": [{"op": "add", "path": "/messages/-", "value": {"role": "assistant", "content": f"answer {i} " * 10}}],
+        "versions": {"messages": i},
+        "timestamp": timestamp,
+    }
+
+
+def bench_legacy(events: int, burst: int):
+    writes = 0
+    start = time.perf_counter()
+    for i in range(events):
+        event = make_event(i, datetime.now().isoformat())
+        chunk = f"id: {i}\ndata: {json.dumps(event)}\n\n"
+        chunk.encode("utf-8")  # what the response does with each str chunk
+        writes += 1
+    return time.perf_counter() - start, writes
+
+
+def bench_serializer(serializer, events: int, burst: int):
+    writes = 0
+    start = time.perf_counter()
+    for first in range(0, events, burst):
+        frames = []
+        for i in range(first, min(first + burst, events)):
+            payload = serializer.dumps(make_event(i, datetime.now()))
+            frames.append(sse_frame(payload, i))
+        b"".join(frames)
+        writes += 1
+    return time.perf_counter() - start, writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SSE event serialization")
+    parser.add_argument("--events", type=int, default=100000, help="Events to encode")
+    parser.add_argument("--burst", type=int, default=10, help="Events ready at once, coalesced into one write")
+    args = parser.parse_args()
+
+    results = [("legacy json.dumps", *bench_legacy(args.events, args.burst))]
+    results.append(("json serializer", *bench_serializer(get_serializer("json"), args.events, args.burst)))
+    if orjson is not None:
+        results.append(("orjson serializer", *bench_serializer(get_serializer("orjson"), args.events, args.burst)))
+    else:
+        print("⚠️  orjson not installed, skipping the fast path")
+
+    baseline = results[0][1]
+    print(f"📦 {args.events} events, bursts of {args.burst}")
+    for name, seconds, writes in results:
+        per_event = seconds / args.events * 1e6
+        print(f"{name:18} {per_event:6.2f} µs/event  {writes:7d} writes  {baseline / seconds:4.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare full-state events with JSON patch events on a large graph state.
+
+Simulates a run where every node appends one message and updates a small
+field while a large RAG context stays unchanged, and measures the payload
+size and json.dumps time of each event protocol.
+
+Run from the streaming directory:
+    python benchmark_state_events.py --nodes 50 --messages 2000
+"""
+
+import argparse
+import json
+import time
+
+from state_diff import StateTracker
+
+
+def build_state(messages: int, context_kb: int) -> dict:
+    return {
+        "question": "How to retrieve the glossary for a user?",
+        "rag_context": "glossary term translation " * (context_kb * 1024 // 26),
+        "messages": [{"role": "user", "content": f"message {i} " * 20} for i in range(messages)],
+        "step": 0,
+    }
+
+
+def run_node(state: dict, i: int) -> dict:
+    """A node that appends a message and bumps a counter, returning new values"""
+    return {
+        "messages": state["messages"] + [{"role": "assistant", "content": f"answer {i}"}],
+        "step": state["step"] + 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark state event payloads")
+    parser.add_argument("--nodes", type=int, default=50, help="Node executions to simulate")
+    parser.add_argument("--messages", type=int, default=2000, help="Messages in the initial state")
+    parser.add_argument("--context-kb", type=int, default=500, help="Size of the unchanged RAG context")
+    args = parser.parse_args()
+
+    initial = build_state(args.messages, args.context_kb)
+
+    # Full snapshot after every node, like the old dict(result) events
+    state = dict(initial)
+    full_bytes = 0
+    full_seconds = 0.0
+    for i in range(args.nodes):
+        state.update(run_node(state, i))
+        start = time.perf_counter()
+        payload = json.dumps({"node_name": f"node{i}", "state": state})
+        full_seconds += time.perf_counter() - start
+        full_bytes += len(payload)
+
+    # Patches only, plus the initial snapshot
+    state = dict(initial)
+    tracker = StateTracker()
+    start = time.perf_counter()
+    patch_bytes = len(json.dumps(tracker.reset(initial)))
+    patch_seconds = time.perf_counter() - start
+    for i in range(args.nodes):
+        result = run_node(state, i)
+        state.update(result)
+        start = time.perf_counter()
+        payload = json.dumps(tracker.update(f"node{i}", result))
+        patch_seconds += time.perf_counter() - start
+        patch_bytes += len(payload)
+
+    print(f"📦 {args.nodes} node events, {args.messages} messages, {args.context_kb} KB context")
+    print(f"Full state: {full_bytes / 1e6:8.2f} MB  {full_seconds * 1000:8.1f} ms")
+    print(f"Patches:    {patch_bytes / 1e6:8.2f} MB  {patch_seconds * 1000:8.1f} ms (incl. diffing and initial snapshot)")
+    print(f"Reduction:  {full_bytes / patch_bytes:.0f}x bytes, {full_seconds / patch_seconds:.0f}x time")
+
+
+if __name__ == "__main__":
+    main()
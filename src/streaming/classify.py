@@ -1,41 +1,17 @@
 import re
 
-from chonkie import SemanticChunker
-from rapidfuzz import fuzz
-
-# Keywords for detection
-
-PYTHON_KEYWORDS = ['def', 'import', 'return', 'print', 'lambda', 'class', '#']
-SQL_KEYWORDS = ['select', 'from', 'where', 'insert', 'update', 'delete', '--', 'join']
-
-def score_keywords(keywords, text):
-    return max([fuzz.token_set_ratio(k, text) for k in keywords])
+from rag.chunkerregistry import get_chunker, print_chunker_stats
+from rag.contenttype import classify_batch, detect_content_type
 
 def detect_type(chunk: str) -> str:
-    text = chunk.strip().lower()
-
-    python_score = score_keywords(PYTHON_KEYWORDS, text)
-    sql_score = score_keywords(SQL_KEYWORDS, text)
-
-    # Debug (optional)
-    print(f"PYTHON={python_score}, SQL={sql_score}, TEXT='{chunk[:30]}...'")
-
-    max_score = max(python_score, sql_score)
-
-    if max_score < 60:
-        return "text"
-    if python_score > sql_score:
-        return "python"
-    else:
-        return "sql"
+    return detect_content_type(chunk)
 
 # Main logic
 def classify_sections(text: str):
-      # Basic initialization with default parameters
-    chunker = SemanticChunker(
-        # embedding_model="minishlab/potion-base-8M",  # Default model
+    # Shared chunker; the embedding model is only loaded on the first call
+    chunker = get_chunker(
         threshold=0.5,                               # Similarity threshold (0-1) or (1-100) or "auto"
-        chunk_size=2048,                              # Maximum tokens per chunk
+        chunk_size=2048,                             # Maximum tokens per chunk
         min_sentences=1,                             # Initial sentences per chunk
         delim=["\n\n"]
     )
@@ -43,9 +19,11 @@ def classify_sections(text: str):
 
     sentences = chunks[0].sentences
 
+    # Label every sentence in one batched call
+    types = classify_batch([sentence.text for sentence in sentences])
     return [
-          {"type": detect_type(sentence.text), "content": sentence.text.strip()}
-          for sentence in sentences
+          {"type": content_type, "content": sentence.text.strip()}
+          for sentence, content_type in zip(sentences, types)
       ]
 
 
@@ -76,3 +54,5 @@ results = classify_sections(SAMPLE_TEXT)
 
 for r in results:
     print(f"[{r['type'].upper()}]\n{r['content']}\n")
+
+print_chunker_stats()
@@ -1,21 +1,8 @@
-from pygments.lexers import guess_lexer, get_lexer_by_name
-from pygments.util import ClassNotFound
-
-from pygments.lexers import guess_lexer
-from pygments.util import ClassNotFound
+from rag.contenttype import pygments_language
 
 def _detect_content_type(text: str) -> str:
     """Detect programming language using Pygments with misdetection fixes."""
-    lexer = guess_lexer(text)
-    language = lexer.aliases[0] if lexer.aliases else lexer.name.lower()
-    misdetection_fixes = {
-        'teratermmacro': 'python',
-        'gdscript': 'javascript',
-    }
-    
-    if language in misdetection_fixes:
-        return misdetection_fixes[language]
-    return language or ""
+    return pygments_language(text)
 
     
 
@@ -1,74 +1,231 @@
-from typing import AsyncGenerator, Callable
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple
 import asyncio
-import json
+import os
 from datetime import datetime
-import queue
 import threading
 from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import uuid4
 
+from event_log import EventLog
+from serializer import PING_FRAME, STREAM_END_FRAME, get_serializer, sse_frame
+from state_diff import StateTracker
+from stream_policy import StreamPolicy, StreamStats
 
-class EventEmitter:
-    def __init__(self):
-        self.event_queue: queue.Queue = queue.Queue()
+# Events kept in memory per run for replay; older ones are dropped (or spilled)
+DEFAULT_BUFFER_SIZE = 1000
+
+# Seconds an unfinished run waits for a client to reconnect before it is cancelled
+DEFAULT_RESUME_GRACE = 30.0
+
+# Seconds a finished run stays available for late reconnects
+DEFAULT_RETENTION = 120.0
+
+# Directory for on-disk event logs; unset keeps events in memory only
+EVENT_LOG_DIR = os.environ.get("EVENT_LOG_DIR")
+
+# Patches between full state snapshots for late joiners (0 disables)
+DEFAULT_SNAPSHOT_EVERY = 20
+
+# Stream a node_profile event after every node
+STREAM_NODE_PROFILES = os.environ.get("STREAM_NODE_PROFILES", "0") == "1"
+
+# Delivered after the last event of a run to mark it finished
+_END_OF_RUN = object()
+
+
+class GraphCancelled(Exception):
+    """Raised inside a graph run whose stream was closed"""
+
+
+# Channel of the graph run executing in the current thread/context
+_current_channel: ContextVar[Optional["EventChannel"]] = ContextVar("current_channel", default=None)
+
+
+class EventChannel:
+    """
+    Events of a single graph run.
+
+    Events are serialized in the emitting thread, off the event loop, and
+    appended to a replayable log with monotonic ids. Any number of SSE
+    streams read the log through their own cursor, so a client that drops
+    can reconnect with Last-Event-ID and only receive what it missed.
+    """
+
+    def __init__(self, run_id: str, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 on_close: Optional[Callable[[str], None]] = None,
+                 policy: Optional[StreamPolicy] = None,
+                 snapshot_every: int = DEFAULT_SNAPSHOT_EVERY,
+                 spill_path: Optional[str] = None,
+                 resume_grace: float = DEFAULT_RESUME_GRACE,
+                 retention: float = DEFAULT_RETENTION,
+                 serializer=None,
+                 stream_profiles: bool = STREAM_NODE_PROFILES):
+        self.run_id = run_id
+        self.serializer = serializer or get_serializer()
+        self.policy = policy or StreamPolicy()
+        self.stream_profiles = stream_profiles
+        self.state_tracker = StateTracker(snapshot_every)
+        # Graph threads update the tracker while lagging streams read it for snapshots
+        self._state_lock = threading.Lock()
+        self.log = EventLog(buffer_size, spill_path)
         self.completed = threading.Event()
+        self.finished = False
         self.execution_started = False
-    
+        self.closed = False
+        self.cancelled = threading.Event()
+        self.consumers = 0
+        self.streams: Dict[int, StreamStats] = {}
+        self._next_stream_id = 0
+        self.resume_grace = resume_grace
+        self.retention = retention
+        self._close_callbacks: List[Callable[[], None]] = []
+        self._on_close = on_close
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List = []
+        self._waiters: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = threading.Lock()
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass  # bound when the consumer starts
+
+    def _bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Attach the consumer's loop and deliver anything emitted before it existed"""
+        with self._lock:
+            self._loop = loop
+            pending, self._pending = self._pending, []
+        for item, kind in pending:
+            self._deliver(item, kind)
+
+    def _deliver(self, item, kind: str = ""):
+        """Runs on the event loop: log the encoded event and wake up waiting streams"""
+        if self.closed:
+            return
+        if item is _END_OF_RUN:
+            self.finished = True
+            if self.consumers == 0:
+                self._schedule(self.retention)
+        else:
+            self.log.append(item, kind)
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+
+    def _put(self, item, kind: str = ""):
+        """Encode an event and hand it to the loop from any thread without blocking the graph"""
+        if self.closed:
+            return
+        if item is not _END_OF_RUN:
+            item = self.serializer.dumps(item)
+        with self._lock:
+            loop = self._loop
+            if loop is None:
+                self._pending.append((item, kind))
+                return
+        try:
+            loop.call_soon_threadsafe(self._deliver, item, kind)
+        except RuntimeError:
+            pass  # loop already closed, nobody is listening
+
+    async def _wait_for_event(self, timeout: float):
+        """Sleep until the next delivery; raises asyncio.TimeoutError after timeout"""
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        await asyncio.wait_for(waiter, timeout)
+
+    def _schedule(self, delay: float):
+        """Close the channel after delay seconds unless a stream attaches first"""
+        if self._timer:
+            self._timer.cancel()
+        self._timer = self._loop.call_later(delay, self.close)
+
+    def _attach(self):
+        self.consumers += 1
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _detach(self):
+        self.consumers -= 1
+        if self.consumers == 0 and not self.closed:
+            # Unfinished runs get a grace period to reconnect before being cancelled
+            self._schedule(self.retention if self.finished else self.resume_grace)
+
     def emit_event_sync(self, node_name: str, state: dict):
         """Synchronous method to emit events from non-async contexts"""
         event_data = {
             "node_name": node_name,
             "state": state,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }
-        self.event_queue.put(event_data)
-    
+        self._put(event_data)
+
+    def emit_state_update(self, node_name: str, result: dict, reducers: Optional[Dict[str, Callable]] = None):
+        """Emit only the keys a node changed, as a JSON patch, plus periodic snapshots"""
+        with self._state_lock:
+            event_data = self.state_tracker.update(node_name, result, reducers)
+        if event_data is None:
+            return
+        event_data["timestamp"] = datetime.now()
+        self._put(event_data, "state")
+        if self.state_tracker.snapshot_due():
+            self.emit_snapshot()
+
+    def emit_node_profile(self, profile: dict):
+        """Emit a node's timings and sizes, if profile streaming is enabled"""
+        if not self.stream_profiles:
+            return
+        self._put({"type": "node_profile", **profile, "timestamp": datetime.now()})
+
+    def emit_snapshot(self):
+        """Emit the full tracked state so late joiners can start applying patches"""
+        with self._state_lock:
+            snapshot = self.state_tracker.snapshot_event()
+        snapshot["timestamp"] = datetime.now()
+        self._put(snapshot, "state")
+
     def start_execution(self):
         """Signal that a new graph execution is starting"""
-        self.reset()
         self.execution_started = True
         start_event = {
             "type": "execution_start",
+            "run_id": self.run_id,
             "message": "Graph execution started",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }
-        self.event_queue.put(start_event)
-    
+        self._put(start_event)
+
     def signal_completion(self):
         """Signal that the graph execution is complete"""
         if self.execution_started:
             completion_event = {
                 "type": "execution_complete",
                 "message": "Graph execution completed successfully",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now()
             }
-            self.event_queue.put(completion_event)
+            self._put(completion_event)
         self.completed.set()
-    
+        self._put(_END_OF_RUN)
+
     def signal_error(self, error_msg: str):
         """Signal that an error occurred during execution"""
         if self.execution_started:
             error_event = {
                 "type": "execution_error",
                 "message": f"Graph execution failed: {error_msg}",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now()
             }
-            self.event_queue.put(error_event)
+            self._put(error_event)
         self.completed.set()
-    
-    def reset(self):
-        """Reset the event emitter for a new execution"""
-        # Clear any remaining items in queue
-        while not self.event_queue.empty():
-            try:
-                self.event_queue.get_nowait()
-            except queue.Empty:
-                break
-        self.completed.clear()
-        self.execution_started = False
-    
+        self._put(_END_OF_RUN)
+
     @contextmanager
     def execution_context(self):
         """Context manager for handling graph execution lifecycle"""
+        token = _current_channel.set(self)
         try:
             self.start_execution()
             yield self
@@ -77,66 +234,294 @@ class EventEmitter:
             raise
         else:
             self.signal_completion()
-    
+        finally:
+            _current_channel.reset(token)
+
     def create_and_run_graph(self, initial_state: dict, graph_factory_func: Callable) -> dict:
         """
         Create and run a graph within the execution context.
-        
+
         Args:
             initial_state: The initial state for the graph
             graph_factory_func: A function that creates and returns a compiled graph
-        
+
         Returns:
             The final state after graph execution
         """
         with self.execution_context():
-            print(f"Creating and running graph with initial state: {initial_state}")
-            
+            print(f"[{self.run_id}] Creating and running graph with initial state: {initial_state}")
+            with self._state_lock:
+                self.state_tracker.reset(initial_state)
+            self.emit_snapshot()
+
             # Create and compile the graph using the factory function
             runner = graph_factory_func()
-            
+
             # Run the graph
             result = runner.invoke(initial_state)
-            
+
             # Emit final result
             result_state = {"message": result.get("message", "")}
-            print(f"Final result: {result_state}")
+            print(f"[{self.run_id}] Final result: {result_state}")
             self.emit_event_sync("GRAPH_COMPLETE", result_state)
-            
+
             return result
-    
-    async def get_events(self) -> AsyncGenerator[str, None]:
-        """Generate SSE events until completion is signaled"""
-        while not self.completed.is_set():
-            try:
-                # Try to get event with timeout
-                event = self.event_queue.get(timeout=0.5)
-                yield f"data: {json.dumps(event)}\n\n"
-                self.event_queue.task_done()
-            except queue.Empty:
-                # Send keep-alive ping if not completed
-                if not self.completed.is_set():
-                    yield "data: {\"type\": \"ping\"}\n\n"
-                await asyncio.sleep(0.1)
-        
-        # Send any remaining events after completion
-        while not self.event_queue.empty():
-            try:
-                event = self.event_queue.get_nowait()
-                yield f"data: {json.dumps(event)}\n\n"
-                self.event_queue.task_done()
-            except queue.Empty:
-                break
-        
-        # Send final completion event if we haven't sent one yet
-        if self.execution_started:
-            final_event = {
-                "type": "stream_end",
-                "message": "Event stream ended",
-                "timestamp": datetime.now().isoformat()
-            }
-            yield f"data: {json.dumps(final_event)}\n\n"
+
+    async def create_and_run_graph_async(self, initial_state: dict, graph_factory_func: Callable) -> dict:
+        """
+        Create and run a graph with ainvoke on the current event loop.
+
+        async nodes run as coroutines, so I/O-bound nodes of many runs share
+        one loop; sync nodes are moved to threads by LangGraph. The channel
+        context is a ContextVar, which LangGraph copies into its tasks.
+        """
+        with self.execution_context():
+            print(f"[{self.run_id}] Creating and running async graph with initial state: {initial_state}")
+            with self._state_lock:
+                self.state_tracker.reset(initial_state)
+            self.emit_snapshot()
+
+            # Compiling is CPU-bound; keep it off the loop that serves the streams
+            runner = await asyncio.to_thread(graph_factory_func)
+            result = await runner.ainvoke(initial_state)
+
+            result_state = {"message": result.get("message", "")}
+            print(f"[{self.run_id}] Final result: {result_state}")
+            self.emit_event_sync("GRAPH_COMPLETE", result_state)
+
+            return result
+
+    def raise_if_cancelled(self):
+        """Called between nodes so a cancelled run stops at the next node boundary"""
+        if self.cancelled.is_set():
+            raise GraphCancelled(f"Run {self.run_id} was cancelled")
+
+    def add_close_callback(self, callback: Callable[[], None]):
+        """Register a callback to run when the channel closes, e.g. to cancel a queued run"""
+        self._close_callbacks.append(callback)
+
+    def close(self):
+        """Stop accepting events, cancel the run if unfinished and leave the registry"""
+        if self.closed:
+            return
+        self.closed = True
+        if self._timer:
+            self._timer.cancel()
+        if not self.completed.is_set():
+            if self.execution_started:
+                print(f"[{self.run_id}] No client reconnected, cancelling run")
+            self.cancelled.set()
+        for callback in self._close_callbacks:
+            callback()
+        self.log.close()
+        if self._on_close:
+            self._on_close(self.run_id)
+
+    def _coalesce(self, cursor: int, stats: StreamStats) -> Tuple[List[bytes], int]:
+        """
+        Catch a lagging stream up in one step: keep the unsent lifecycle events,
+        drop the unsent state events and send the current state as a snapshot.
+
+        Patches emitted while the snapshot was taken may be sent again after
+        it; clients skip them using the per-key versions.
+        """
+        events, missed = self.log.read_after(cursor, include_spill=False)
+        frames = []
+        dropped = missed
+        for event_id, payload, kind in events:
+            if kind == "state":
+                dropped += 1
+            else:
+                frames.append(sse_frame(payload, event_id))
+        with self._state_lock:
+            snapshot = self.state_tracker.snapshot()
+        snapshot["timestamp"] = datetime.now()
+        frames.append(sse_frame(self.serializer.dumps({**snapshot, "coalesced": dropped})))
+        stats.coalesced += dropped
+        stats.events_sent += len(frames)
+        return frames, events[-1][0] if events else self.log.last_id
+
+    async def get_events(self, last_event_id: Optional[int] = None,
+                         policy: Optional[StreamPolicy] = None,
+                         is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncGenerator[bytes, None]:
+        """
+        Generate SSE events until the run finishes.
+
+        Args:
+            last_event_id: Id of the last event the client received; only
+                later events are sent
+            policy: Heartbeat, lag and batching policy, defaults to the channel's
+            is_disconnected: Polled before waiting for events, e.g.
+                request.is_disconnected, to stop as soon as the client is gone
+        """
+        policy = policy or self.policy
+        if self._loop is None:
+            self._bind_loop(asyncio.get_running_loop())
+        self._attach()
+        cursor = last_event_id or 0
+        stream_id = self._next_stream_id
+        self._next_stream_id += 1
+        stats = self.streams[stream_id] = StreamStats(stream_id, cursor)
+        # Replaying what the client asked for (after Last-Event-ID, or the whole
+        # run) isn't lag: the lag policy only applies once the stream has caught
+        # up with the log as it was on connect, spilled events included
+        replay_until = self.log.last_id
+        try:
+            while not self.closed:
+                lag = self.log.last_id - cursor
+                stats.observe_lag(lag)
+                frames = []
+                if policy.max_lag and lag > policy.max_lag and cursor >= replay_until:
+                    if policy.lag_strategy == "coalesce":
+                        frames, cursor = self._coalesce(cursor, stats)
+                    else:
+                        skipped = lag - policy.max_lag
+                        cursor += skipped
+                        stats.dropped += skipped
+                        frames.append(sse_frame(self.serializer.dumps({"type": "events_missed", "count": skipped})))
+                else:
+                    events, missed = await self.log.aread_after(cursor, limit=policy.max_batch)
+                    if missed:
+                        # Fell behind further than the buffer; the next snapshot resyncs state
+                        frames.append(sse_frame(self.serializer.dumps({"type": "events_missed", "count": missed})))
+                        stats.dropped += missed
+                    for event_id, payload, _kind in events:
+                        frames.append(sse_frame(payload, event_id))
+                        cursor = event_id
+                    stats.events_sent += len(events)
+                stats.cursor = cursor
+                if frames:
+                    stats.bytes_sent += sum(len(frame) for frame in frames)
+                    if policy.batch_events:
+                        yield b"".join(frames)
+                    else:
+                        for frame in frames:
+                            yield frame
+                    continue
+                if self.finished:
+                    break
+                if is_disconnected:
+                    if await is_disconnected():
+                        return
+                    if self.log.last_id != cursor or self.finished:
+                        continue  # delivered while we were polling; waiting now would miss it
+                try:
+                    # Wake up on the next event, or after the heartbeat interval to ping
+                    await self._wait_for_event(policy.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    stats.pings += 1
+                    yield PING_FRAME
+
+            # Send final completion event if we haven't sent one yet
+            if self.execution_started:
+                yield STREAM_END_FRAME
+        finally:
+            # Runs on normal end and when the client disconnects mid-stream
+            del self.streams[stream_id]
+            self._detach()
+
+    def stats(self) -> Dict[str, Any]:
+        """Progress of the run and lag of every attached stream"""
+        return {
+            "run_id": self.run_id,
+            "last_event_id": self.log.last_id,
+            "finished": self.finished,
+            "streams": [stats.snapshot() for stats in list(self.streams.values())],
+        }
+
+
+class EventEmitter:
+    """Registry of per-run event channels so concurrent streams stay independent"""
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 policy: Optional[StreamPolicy] = None,
+                 snapshot_every: int = DEFAULT_SNAPSHOT_EVERY,
+                 log_dir: Optional[str] = EVENT_LOG_DIR,
+                 resume_grace: float = DEFAULT_RESUME_GRACE,
+                 retention: float = DEFAULT_RETENTION,
+                 serializer=None,
+                 stream_profiles: bool = STREAM_NODE_PROFILES):
+        self.buffer_size = buffer_size
+        self.policy = policy or StreamPolicy()
+        self.snapshot_every = snapshot_every
+        self.log_dir = log_dir
+        self.resume_grace = resume_grace
+        self.retention = retention
+        self.serializer = serializer or get_serializer()
+        self.stream_profiles = stream_profiles
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        self.channels: Dict[str, EventChannel] = {}
+        self._lock = threading.Lock()
+
+    def open_channel(self, run_id: Optional[str] = None) -> EventChannel:
+        """Create the channel for a new graph run"""
+        run_id = run_id or str(uuid4())
+        spill_path = os.path.join(self.log_dir, f"{run_id}.events") if self.log_dir else None
+        channel = EventChannel(run_id, self.buffer_size, on_close=self._remove,
+                               policy=self.policy,
+                               snapshot_every=self.snapshot_every,
+                               spill_path=spill_path,
+                               resume_grace=self.resume_grace,
+                               retention=self.retention,
+                               serializer=self.serializer,
+                               stream_profiles=self.stream_profiles)
+        with self._lock:
+            if run_id in self.channels:
+                raise ValueError(f"Run {run_id} already has an open channel")
+            self.channels[run_id] = channel
+        return channel
+
+    def get_channel(self, run_id: str) -> Optional[EventChannel]:
+        """Look up the channel of a run, if it is still open"""
+        with self._lock:
+            return self.channels.get(run_id)
+
+    def close_channel(self, run_id: str):
+        """Close a run's channel and drop it from the registry"""
+        channel = self.get_channel(run_id)
+        if channel:
+            channel.close()
+
+    def _remove(self, run_id: str):
+        with self._lock:
+            self.channels.pop(run_id, None)
+
+    @property
+    def active_runs(self) -> int:
+        with self._lock:
+            return len(self.channels)
+
+    def stream_stats(self) -> List[Dict[str, Any]]:
+        """Lag and delivery counters of every open run's streams"""
+        with self._lock:
+            channels = list(self.channels.values())
+        return [channel.stats() for channel in channels]
+
+    def emit_event_sync(self, node_name: str, state: dict):
+        """Emit an event on the channel of the graph run executing in this context"""
+        channel = _current_channel.get()
+        if channel is not None:
+            channel.emit_event_sync(node_name, state)
+
+    def emit_state_update(self, node_name: str, result: dict, reducers: Optional[Dict[str, Callable]] = None):
+        """Emit a node's state changes on the channel of the run executing in this context"""
+        channel = _current_channel.get()
+        if channel is not None:
+            channel.emit_state_update(node_name, result, reducers)
+
+    def emit_node_profile(self, profile: dict):
+        """Emit a node profile on the channel of the run executing in this context"""
+        channel = _current_channel.get()
+        if channel is not None:
+            channel.emit_node_profile(profile)
+
+    def raise_if_cancelled(self):
+        """Stop the graph run executing in this context if its stream was closed"""
+        channel = _current_channel.get()
+        if channel is not None:
+            channel.raise_if_cancelled()
 
 
 # Global event emitter instance
-event_emitter = EventEmitter()
\ No newline at end of file
+event_emitter = EventEmitter()
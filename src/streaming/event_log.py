@@ -0,0 +1,139 @@
+from array import array
+from collections import deque
+from itertools import islice
+from typing import Deque, List, Optional, Tuple
+import asyncio
+import os
+import threading
+
+Record = Tuple[int, bytes, str]
+
+
+class EventLog:
+    """
+    Append-only log of one run's events, addressed by monotonic ids.
+
+    Events are stored already encoded, so they are serialized once however
+    many streams replay them, together with a short kind ("state" for state
+    patches and snapshots) that lets slow streams skip superseded events.
+    The newest live in a bounded ring buffer. With a spill path every event
+    is also appended to a file as "id<TAB>kind<TAB>json" lines, so a client
+    that fell further behind than the ring can still catch up from disk.
+    The file offset of every line is kept (8 bytes per event), so a catch-up
+    read seeks straight to its range instead of scanning the file. Reads
+    and close() share a lock, so the file is never deleted under a read
+    still running in a worker thread.
+    """
+
+    def __init__(self, max_events: int = 1000, spill_path: Optional[str] = None):
+        """
+        Args:
+            max_events: Events kept in memory
+            spill_path: Optional file that receives every event
+        """
+        self.buffer: Deque[Record] = deque(maxlen=max_events)
+        self.last_id = 0
+        self.spill_path = spill_path
+        self._spill = open(spill_path, "wb") if spill_path else None
+        # _offsets[id - 1] is where event id starts in the spill file
+        self._offsets = array("Q")
+        self._spill_size = 0
+        self._spill_lock = threading.Lock()
+
+    @property
+    def first_buffered_id(self) -> int:
+        """Oldest id still in memory (last_id + 1 when empty)"""
+        return self.buffer[0][0] if self.buffer else self.last_id + 1
+
+    def append(self, payload: bytes, kind: str = "") -> int:
+        """Store an encoded event (single-line JSON) and return its id"""
+        self.last_id += 1
+        self.buffer.append((self.last_id, payload, kind))
+        if self._spill:
+            line = b"%d\t%s\t%s\n" % (self.last_id, kind.encode(), payload)
+            self._spill.write(line)
+            self._offsets.append(self._spill_size)
+            self._spill_size += len(line)
+        return self.last_id
+
+    def _spill_range(self, after_id: int, until_id: int, limit: Optional[int]) -> Tuple[int, int]:
+        """Byte range of the spilled events after_id < id < until_id, at most limit of them"""
+        end_id = min(until_id, after_id + 1 + limit) if limit else until_id
+        # Flushed here, on the appending thread, so the range is on disk for the reader
+        self._spill.flush()
+        end = self._offsets[end_id - 1] if end_id <= self.last_id else self._spill_size
+        return self._offsets[after_id], end
+
+    def _read_spill_range(self, start: int, end: int) -> List[Record]:
+        """Parse the spill lines in a byte range; only touches the file, so it can run in a thread"""
+        with self._spill_lock:
+            if self._spill is None:
+                return []  # closed while this read waited for its thread
+            with open(self.spill_path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start)
+        events = []
+        for line in data.splitlines():
+            event_id, kind, payload = line.split(b"\t", 2)
+            events.append((int(event_id), payload, kind.decode()))
+        return events
+
+    def _read_buffer(self, start: int, limit: Optional[int]) -> List[Record]:
+        """Ring records from position start; a deque walks to a position, so walk from the nearer end"""
+        size = len(self.buffer)
+        count = min(size - start, limit) if limit else size - start
+        if start <= size - start:
+            return list(islice(self.buffer, start, start + count))
+        tail = list(islice(reversed(self.buffer), size - start))
+        tail.reverse()
+        return tail[:count]
+
+    def read_after(self, after_id: int, limit: Optional[int] = None,
+                   include_spill: bool = True) -> Tuple[List[Record], int]:
+        """
+        Events (id, payload, kind) with an id greater than after_id.
+
+        Args:
+            after_id: Last id the reader already has
+            limit: Most events to return
+            include_spill: Read events evicted from memory back from disk
+
+        Returns:
+            (events, missed) where missed counts events that were evicted from
+            memory and not available on disk
+        """
+        first = self.first_buffered_id
+        events: List[Record] = []
+        missed = 0
+        if after_id + 1 < first:
+            if self._spill and include_spill:
+                events = self._read_spill_range(*self._spill_range(after_id, first, limit))
+                if limit and len(events) >= limit:
+                    return events, 0
+            else:
+                missed = first - after_id - 1
+        start = max(after_id + 1, first)
+        # Ids in the ring are contiguous, so the position of start follows from its id
+        events.extend(self._read_buffer(start - first, limit - len(events) if limit else None))
+        return events, missed
+
+    async def aread_after(self, after_id: int, limit: Optional[int] = None) -> Tuple[List[Record], int]:
+        """
+        read_after for the event loop: evicted events are read back from disk
+        in a worker thread, and only those are returned, so the caller picks
+        up the in-memory events on its next read.
+        """
+        first = self.first_buffered_id
+        if self._spill and after_id + 1 < first:
+            events = await asyncio.to_thread(self._read_spill_range, *self._spill_range(after_id, first, limit))
+            return events, 0
+        return self.read_after(after_id, limit)
+
+    def close(self, delete_spill: bool = True):
+        """Close the spill file, after a read in progress finishes, and delete it"""
+        with self._spill_lock:
+            if self._spill:
+                self._spill.close()
+                self._spill = None
+                if delete_spill and os.path.exists(self.spill_path):
+                    os.remove(self.spill_path)
@@ -0,0 +1,104 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
+import asyncio
+import os
+import threading
+
+# Defaults, overridable through the environment
+DEFAULT_POOL_SIZE = int(os.environ.get("GRAPH_POOL_SIZE", "8"))
+DEFAULT_QUEUE_DEPTH = int(os.environ.get("GRAPH_QUEUE_DEPTH", "32"))
+DEFAULT_MAX_ASYNC_RUNS = int(os.environ.get("GRAPH_MAX_ASYNC_RUNS", "256"))
+
+
+class PoolFullError(Exception):
+    """Raised when the pool is running and queuing as many graphs as allowed"""
+
+
+class GraphExecutionPool:
+    """
+    App-wide pool that runs graph executions off the event loop.
+
+    Uses threads rather than processes because nodes emit events into
+    in-process channels. At most max_workers graphs run at once and at most
+    max_queue_depth more wait for a worker; anything beyond that is rejected
+    so the API can answer 429 instead of piling up work.
+
+    Graphs with async nodes run as tasks on the event loop instead, and
+    don't hold a worker; max_async_runs bounds them separately.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue_depth: Optional[int] = None,
+                 max_async_runs: Optional[int] = None):
+        self.max_workers = max_workers or DEFAULT_POOL_SIZE
+        self.max_queue_depth = DEFAULT_QUEUE_DEPTH if max_queue_depth is None else max_queue_depth
+        self.max_async_runs = max_async_runs or DEFAULT_MAX_ASYNC_RUNS
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="graph")
+        self._in_flight = 0
+        self._async_in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue_depth
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """
+        Schedule a graph execution.
+
+        Raises:
+            PoolFullError: If running plus queued executions already reach capacity
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise PoolFullError(f"Graph pool is full ({self._in_flight}/{self.capacity})")
+            self._in_flight += 1
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def submit_async(self, coro_fn: Callable[..., Awaitable], *args) -> asyncio.Task:
+        """
+        Schedule an async graph execution as a task on the running loop.
+
+        Raises:
+            PoolFullError: If max_async_runs executions are already running
+        """
+        with self._lock:
+            if self._async_in_flight >= self.max_async_runs:
+                raise PoolFullError(f"Async graph runs are at capacity ({self._async_in_flight}/{self.max_async_runs})")
+            self._async_in_flight += 1
+        task = asyncio.get_running_loop().create_task(coro_fn(*args))
+        task.add_done_callback(self._release_async)
+        return task
+
+    def _release_async(self, task: asyncio.Task):
+        with self._lock:
+            self._async_in_flight -= 1
+        if not task.cancelled():
+            task.exception()  # errors already reach the client as execution_error events
+
+    def stats(self) -> dict:
+        """Current load of the pool"""
+        with self._lock:
+            in_flight = self._in_flight
+            async_in_flight = self._async_in_flight
+        return {
+            "running": min(in_flight, self.max_workers),
+            "queued": max(in_flight - self.max_workers, 0),
+            "max_workers": self.max_workers,
+            "max_queue_depth": self.max_queue_depth,
+            "async_running": async_in_flight,
+            "max_async_runs": self.max_async_runs,
+        }
+
+    def shutdown(self):
+        """Stop accepting work and drop queued executions"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,26 +1,61 @@
-from typing import Callable, TypedDict
+from typing import Awaitable, Callable, Dict, Optional, TypedDict, Union
+import asyncio
+import functools
+import inspect
 from langgraph.graph import StateGraph
 from event_emitter import event_emitter
+from profiling import node_profiler
+from state_diff import Reducer, state_reducers
 
 
 class State(TypedDict):
     message: str
 
 
-def with_state_tracking(node_func: Callable[[State], State], node_name: str) -> Callable[[State], State]:
-    """Wrapper function to add state tracking to graph nodes"""
+NodeFunc = Union[Callable[[State], State], Callable[[State], Awaitable[State]]]
+
+
+def with_state_tracking(node_func: NodeFunc, node_name: str,
+                        reducers: Optional[Dict[str, Reducer]] = None) -> NodeFunc:
+    """
+    Wrapper function to add state tracking to graph nodes.
+
+    async def nodes get an async wrapper, so LangGraph awaits them under
+    ainvoke/astream instead of receiving a coroutine as the node result.
+    reducers are the state schema's channel reducers, so updates to keys
+    like Annotated[list, operator.add] are tracked as the reduced value.
+    """
+    # wraps: LangGraph reads the node's input schema from its signature, which
+    # must be the wrapped node's, not this wrapper's State annotation
+    if inspect.iscoroutinefunction(node_func):
+        @functools.wraps(node_func)
+        async def async_wrapper(state: State) -> State:
+            event_emitter.raise_if_cancelled()
+            result, profile = await node_profiler.arun(node_name, node_func, state)
+            # Emitting never blocks: events are handed to the loop with call_soon_threadsafe
+            event_emitter.emit_state_update(node_name, result, reducers)
+            event_emitter.emit_node_profile(profile)
+            return result
+        return async_wrapper
+
+    @functools.wraps(node_func)
     def wrapper(state: State) -> State:
-        result = node_func(state)
-        # Emit event synchronously - convert TypedDict to dict for the event emitter
-        event_emitter.emit_event_sync(node_name, dict(result))
+        # Stop at the node boundary if the client went away
+        event_emitter.raise_if_cancelled()
+        result, profile = node_profiler.run(node_name, node_func, state)
+        # Emit only what changed since the last event, as a JSON patch
+        event_emitter.emit_state_update(node_name, result, reducers)
+        event_emitter.emit_node_profile(profile)
         return result
     return wrapper
 
 
 class TrackedStateGraph(StateGraph):
     """StateGraph subclass that automatically tracks state changes"""
-    def add_node(self, key: str, action: Callable[[State], State]) -> None:  # type: ignore
-        wrapped_action = with_state_tracking(action, key)
+    def add_node(self, key: str, action: NodeFunc) -> None:  # type: ignore
+        # state_schema in current LangGraph, schema in older releases
+        schema = getattr(self, "state_schema", None) or self.schema
+        wrapped_action = with_state_tracking(action, key, state_reducers(schema))
         super().add_node(key, wrapped_action)  # type: ignore
 
 
@@ -51,4 +86,26 @@ def create_sample_graph() -> Callable:
         # Compile and return
         return graph.compile()
     
-    return factory
\ No newline at end of file
+    return factory
+
+
+def create_async_sample_graph() -> Callable:
+    """Factory for a sample graph with async nodes, to be run with ainvoke/astream"""
+    def factory():
+        async def node1(state: State) -> State:
+            await asyncio.sleep(0.1)  # stands in for an LLM or HTTP call
+            return {"message": "Hello from async Node 1"}
+
+        async def node2(state: State) -> State:
+            await asyncio.sleep(0.1)
+            return {"message": state["message"] + " -> async Node 2"}
+
+        graph = TrackedStateGraph(State)
+        graph.add_node("node1", node1)
+        graph.add_node("node2", node2)
+        graph.add_edge("node1", "node2")
+        graph.set_entry_point("node1")
+        graph.set_finish_point("node2")
+        return graph.compile()
+
+    return factory
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Async load generator for the graph streaming API.
+
+Ramps up N concurrent SSE clients and measures, per stream, the connect
+latency (until response headers), time to first event, gaps between events
+and whether the stream completed. Prints a summary and writes a JSON report.
+
+Run from the streaming directory. With --serve a local uvicorn instance of
+stream_api (using the create_sample_graph stub) is started and stopped:
+    python load_test_sse.py --serve --clients 200 --ramp 5
+Against an already running server:
+    python load_test_sse.py --url http://localhost:8000 --clients 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+
+
+class StreamResult:
+    """Measurements of one client stream"""
+
+    def __init__(self, client_id: int):
+        self.client_id = client_id
+        self.status: Optional[int] = None
+        self.connect_s: Optional[float] = None
+        self.first_event_s: Optional[float] = None
+        self.event_gaps_s: List[float] = []
+        self.events = 0
+        self.pings = 0
+        self.completed = False
+        self.error: Optional[str] = None
+        self.duration_s = 0.0
+
+
+def percentiles(values: List[float]) -> dict:
+    """p50/p90/p99/max in milliseconds"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(p):
+        return round(ordered[min(int(p / 100 * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+    return {"count": len(ordered), "p50_ms": pick(50), "p90_ms": pick(90), "p99_ms": pick(99),
+            "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+async def run_client(client: httpx.AsyncClient, url: str, message: str, client_id: int, delay: float) -> StreamResult:
+    result = StreamResult(client_id)
+    await asyncio.sleep(delay)
+    start = time.perf_counter()
+    last_event = None
+    try:
+        async with client.stream("POST", url, json={"message": message},
+                                 headers={"Accept": "text/event-stream"}) as response:
+            result.status = response.status_code
+            result.connect_s = time.perf_counter() - start
+            if response.status_code != 200:
+                await response.aread()
+                return result
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                now = time.perf_counter()
+                event = json.loads(line[5:])
+                if event.get("type") == "ping":
+                    result.pings += 1
+                    continue
+                if last_event is None:
+                    result.first_event_s = now - start
+                else:
+                    result.event_gaps_s.append(now - last_event)
+                last_event = now
+                result.events += 1
+                if event.get("type") == "stream_end":
+                    result.completed = True
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    finally:
+        result.duration_s = time.perf_counter() - start
+    return result
+
+
+async def run_load(url: str, clients: int, ramp: float, message: str, timeout: float) -> List[StreamResult]:
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        tasks = [
+            run_client(client, url, message, i, ramp * i / clients)
+            for i in range(clients)
+        ]
+        return await asyncio.gather(*tasks)
+
+
+def build_report(results: List[StreamResult], wall_s: float, args) -> dict:
+    statuses = {}
+    for r in results:
+        key = str(r.status) if r.status is not None else "no_response"
+        statuses[key] = statuses.get(key, 0) + 1
+    completed = sum(r.completed for r in results)
+    errors = [r.error for r in results if r.error]
+    return {
+        "url": args.url + args.path,
+        "clients": args.clients,
+        "ramp_s": args.ramp,
+        "wall_s": round(wall_s, 3),
+        "completion_rate": round(completed / len(results), 4) if results else 0,
+        "completed": completed,
+        "statuses": statuses,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "events": sum(r.events for r in results),
+        "pings": sum(r.pings for r in results),
+        "events_per_s": round(sum(r.events for r in results) / wall_s, 1) if wall_s else 0,
+        "connect": percentiles([r.connect_s for r in results if r.connect_s is not None]),
+        "time_to_first_event": percentiles([r.first_event_s for r in results if r.first_event_s is not None]),
+        "inter_event": percentiles([gap for r in results for gap in r.event_gaps_s]),
+        "stream_duration": percentiles([r.duration_s for r in results if r.completed]),
+    }
+
+
+def print_report(report: dict):
+    print(f"📊 {report['clients']} clients over {report['ramp_s']}s against {report['url']}")
+    print(f"   Completed: {report['completed']} ({report['completion_rate']:.1%}), statuses: {report['statuses']}, errors: {report['errors']}")
+    print(f"   Events: {report['events']} ({report['events_per_s']}/s), pings: {report['pings']}, wall: {report['wall_s']}s")
+    for name in ("connect", "time_to_first_event", "inter_event", "stream_duration"):
+        stats = report[name]
+        if stats["count"]:
+            print(f"   {name:20} p50 {stats['p50_ms']:8.2f} ms  p90 {stats['p90_ms']:8.2f} ms  "
+                  f"p99 {stats['p99_ms']:8.2f} ms  max {stats['max_ms']:8.2f} ms")
+    for error in report["error_samples"]:
+        print(f"   ❌ {error}")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> subprocess.Popen:
+    """Start stream_api under uvicorn in a separate process so clients don't share its loop"""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "stream_api:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start within 30s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Graph Streaming API")
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the API")
+    parser.add_argument("--path", default="/stream-graph", help="Streaming endpoint (/stream-graph or /stream-graph-async)")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which clients are started")
+    parser.add_argument("--message", default="Load test message", help="Message to send to the graph")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--report", default="load_report.json", help="Where to write the JSON report")
+    parser.add_argument("--serve", action="store_true", help="Start a local uvicorn instance for the test")
+    args = parser.parse_args()
+
+    server = None
+    if args.serve:
+        port = free_port()
+        args.url = f"http://127.0.0.1:{port}"
+        print(f"🚀 Starting uvicorn on port {port}")
+        server = start_server(port)
+
+    try:
+        start = time.perf_counter()
+        results = asyncio.run(run_load(args.url + args.path, args.clients, args.ramp, args.message, args.timeout))
+        report = build_report(results, time.perf_counter() - start, args)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print_report(report)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 from typing import Optional, TypedDict, Callable
 from langgraph.graph import StateGraph
+import copy
 import json
 
+from profiling import node_profiler
+from state_diff import diff_state, parse_pointer
+
 # Define state
 class StateRequired(TypedDict):
     message: str
@@ -22,27 +26,27 @@ def with_state_tracking(node_func: Callable[[State], State], node_name: str) ->
     def wrapper(state: State) -> State:
         print(f"\n--- {node_name} START ---")
         
-        result = node_func(state)
+        # Copied so a node that mutates a state value in place still shows up as a change
+        before = copy.deepcopy(state)
+        result, profile = node_profiler.run(node_name, node_func, state)
         
-        # Find changes
-        changes = {}
-        for k in result:
-            if k not in state:
-                changes[k] = ("NEW", _truncate(result[k]))
-            elif result[k] != state[k]:
-                changes[k] = (_truncate(state[k]), _truncate(result[k]))
+        # Find changes; values are only stringified for the keys that changed
+        patch = diff_state(before, result)
         
-        if changes:
+        if patch:
             print("Changes:")
-            for key, change in changes.items():
-                if change[0] == "NEW":
-                    print(f" NEW - {key}: {change[1]}")
+            for op in patch:
+                key, *rest = parse_pointer(op["path"])
+                if op["op"] == "replace":
+                    print(f" CHANGE - {key}: {_truncate(before[key])} -> {_truncate(op['value'])}")
+                elif rest:
+                    print(f" APPEND - {key}: {_truncate(op['value'])}")
                 else:
-                    print(f" CHANGE - {key}: {change[0]} -> {change[1]}")
+                    print(f" NEW - {key}: {_truncate(op['value'])}")
         else:
             print("No changes")
         
-        print(f"--- {node_name} END ---\n")
+        print(f"--- {node_name} END ({profile['wall_ms']:.2f} ms wall, {profile['cpu_ms']:.2f} ms CPU) ---\n")
         return result
     
     return wrapper
@@ -81,4 +85,8 @@ runner = graph.compile()
 result = runner.invoke({"message": "", "count": 0})
 
 print("\nFinal result:")
-print(json.dumps(result, indent=2))
\ No newline at end of file
+print(json.dumps(result, indent=2))
+
+print("\nNode profile:")
+for name, stats in node_profiler.stats()["nodes"].items():
+    print(f" {name}: {stats['calls']} calls, mean {stats['wall_ms']['mean']:.2f} ms wall, {stats['cpu_ms']['mean']:.2f} ms CPU")
\ No newline at end of file
@@ -0,0 +1,237 @@
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+from serializer import get_serializer
+
+# Fraction of node calls that also trace allocations and measure state sizes
+DEFAULT_SAMPLE_RATE = float(os.environ.get("NODE_PROFILE_SAMPLE_RATE", "0.1"))
+
+# Upper bounds of the histogram buckets; values above the last one go to an overflow bucket
+MS_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+BYTE_BUCKETS = [64 * 4 ** i for i in range(12)]  # 64 B .. 256 MB
+
+
+class Histogram:
+    """Fixed-bucket histogram with exact count, sum, min and max"""
+
+    def __init__(self, buckets: List[float]):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-th percentile (max for the overflow bucket)"""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": {str(bound): n for bound, n in zip(self.bounds + ["inf"], self.counts) if n},
+        }
+
+
+class NodeStats:
+    """Histograms for one node"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.wall_ms = Histogram(MS_BUCKETS)
+        self.cpu_ms = Histogram(MS_BUCKETS)
+        self.alloc_bytes = Histogram(BYTE_BUCKETS)
+        self.peak_bytes = Histogram(BYTE_BUCKETS)
+        self.input_bytes = Histogram(BYTE_BUCKETS)
+        self.output_bytes = Histogram(BYTE_BUCKETS)
+
+    def add(self, record: Dict[str, Any]):
+        self.calls += 1
+        if record["error"]:
+            self.errors += 1
+        self.wall_ms.observe(record["wall_ms"])
+        for name in ("cpu_ms", "alloc_bytes", "peak_bytes", "input_bytes", "output_bytes"):
+            if record.get(name) is not None:
+                getattr(self, name).observe(record[name])
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wall_ms": self.wall_ms.summary(),
+            "cpu_ms": self.cpu_ms.summary(),
+            "alloc_bytes": self.alloc_bytes.summary(),
+            "peak_bytes": self.peak_bytes.summary(),
+            "input_bytes": self.input_bytes.summary(),
+            "output_bytes": self.output_bytes.summary(),
+        }
+
+
+class NodeProfiler:
+    """
+    Per-node wall time, CPU time, allocation and state size histograms.
+
+    Wall and CPU time (of the calling thread) are recorded for every call;
+    async nodes only get wall time.
+    A sample of calls also measures the encoded size of the input state and
+    the node result, and sync calls run under tracemalloc. tracemalloc is
+    only active while a sampled call runs, but it is process-wide, so
+    allocations of graphs running concurrently in other threads are counted
+    too. Async nodes are never traced: across their awaits every other task
+    on the loop would run traced and be counted against the node.
+    """
+
+    def __init__(self, sample_rate: float = DEFAULT_SAMPLE_RATE, serializer=None):
+        """
+        Args:
+            sample_rate: Fraction of calls with allocation and size tracking (0 disables)
+            serializer: Used to measure state sizes, defaults to the SSE serializer
+        """
+        self.sample_rate = sample_rate
+        self.serializer = serializer or get_serializer()
+        self.nodes: Dict[str, NodeStats] = {}
+        self._lock = threading.Lock()
+        self._tracing_calls = 0
+        self._started_tracing = False
+        self._trace_lock = threading.Lock()
+
+    def _size(self, value: Any) -> Optional[int]:
+        try:
+            return len(self.serializer.dumps(value))
+        except TypeError:
+            return None  # state holds objects the serializer can't encode
+
+    def _start_tracing(self) -> Tuple[int, bool]:
+        """Start tracemalloc for a sampled call; returns (traced bytes, whether this call owns the peak)"""
+        with self._trace_lock:
+            self._tracing_calls += 1
+            owner = self._tracing_calls == 1
+            if owner:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started_tracing = True
+                tracemalloc.reset_peak()
+            return tracemalloc.get_traced_memory()[0], owner
+
+    def _stop_tracing(self, before: int, owner: bool) -> Tuple[int, Optional[int]]:
+        with self._trace_lock:
+            current, peak = tracemalloc.get_traced_memory()
+            self._tracing_calls -= 1
+            if self._tracing_calls == 0 and self._started_tracing:
+                # Leave tracing on if someone else (e.g. PYTHONTRACEMALLOC) started it
+                tracemalloc.stop()
+                self._started_tracing = False
+        # The peak is only meaningful for the call that reset it
+        return current - before, (peak - before if owner else None)
+
+    def _begin(self, node_name: str, state: Any, measure_cpu: bool = True,
+               trace_allocations: bool = True) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"node_name": node_name, "error": None}
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if sampled:
+            record["input_bytes"] = self._size(state)
+            if trace_allocations:
+                record["_trace"] = self._start_tracing()
+        record["_wall_start"] = time.perf_counter()
+        record["_cpu_start"] = time.thread_time() if measure_cpu else None
+        return record
+
+    def _end(self, record: Dict[str, Any], error: Optional[BaseException] = None):
+        wall_start = record.pop("_wall_start")
+        cpu_start = record.pop("_cpu_start")
+        record["cpu_ms"] = (time.thread_time() - cpu_start) * 1000 if cpu_start is not None else None
+        record["wall_ms"] = (time.perf_counter() - wall_start) * 1000
+        trace = record.pop("_trace", None)
+        if trace:
+            record["alloc_bytes"], record["peak_bytes"] = self._stop_tracing(*trace)
+        if error is not None:
+            record["error"] = type(error).__name__
+            self._add(record)
+
+    def _finish(self, record: Dict[str, Any], result: Any):
+        if "input_bytes" in record:
+            record["output_bytes"] = self._size(result)
+        self._add(record)
+
+    def run(self, node_name: str, node_func: Callable[[Any], Any], state: Any) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Call a node and record its profile.
+
+        Returns:
+            (result, record) where record holds this call's measurements
+        """
+        record = self._begin(node_name, state)
+        try:
+            result = node_func(state)
+        except BaseException as e:
+            self._end(record, e)
+            raise
+        self._end(record)
+        self._finish(record, result)
+        return result, record
+
+    async def arun(self, node_name: str, node_func: Callable[[Any], Awaitable[Any]], state: Any) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Await an async node and record its profile.
+
+        CPU time and allocations are not recorded (None): other tasks run on
+        the same thread while the node awaits, so both would include them,
+        and tracing across awaits would slow down every task on the loop.
+        """
+        record = self._begin(node_name, state, measure_cpu=False, trace_allocations=False)
+        try:
+            result = await node_func(state)
+        except BaseException as e:  # includes task cancellation, which must still stop tracing
+            self._end(record, e)
+            raise
+        self._end(record)
+        self._finish(record, result)
+        return result, record
+
+    def _add(self, record: Dict[str, Any]):
+        with self._lock:
+            self.nodes.setdefault(record["node_name"], NodeStats()).add(record)
+
+    def stats(self) -> Dict[str, Any]:
+        """Summary per node, hottest (highest total wall time) first"""
+        with self._lock:
+            nodes = sorted(self.nodes.items(), key=lambda item: item[1].wall_ms.total, reverse=True)
+            return {
+                "sample_rate": self.sample_rate,
+                "nodes": {name: node.summary() for name, node in nodes},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.nodes.clear()
+
+
+# Global profiler shared by every tracked graph
+node_profiler = NodeProfiler()
@@ -0,0 +1,71 @@
+from datetime import datetime
+from typing import Any, Optional
+import json
+import os
+
+try:
+    import orjson  # the "fast" extra; langgraph/langsmith usually pull it in too
+except ImportError:
+    orjson = None
+
+# "orjson" or "json"; defaults to orjson when available
+SSE_SERIALIZER = os.environ.get("SSE_SERIALIZER")
+
+
+def _default(obj: Any) -> Any:
+    """Encode datetimes like datetime.isoformat(), as orjson does natively"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JsonSerializer:
+    """Standard library fallback"""
+
+    name = "json"
+
+    def __init__(self):
+        # One encoder for all events; json.dumps with options builds a new one per call
+        self._encoder = json.JSONEncoder(separators=(",", ":"), default=_default)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj).encode()
+
+
+class OrjsonSerializer:
+    """orjson fast path: encodes straight to bytes and handles datetimes in C"""
+
+    name = "orjson"
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default)
+
+
+def get_serializer(name: Optional[str] = SSE_SERIALIZER):
+    """
+    Serializer by name, or the fastest one installed.
+
+    Raises:
+        ValueError: If the name is unknown or orjson was requested but is not installed
+    """
+    if name is None:
+        name = "orjson" if orjson is not None else "json"
+    if name == "json":
+        return JsonSerializer()
+    if name == "orjson":
+        if orjson is None:
+            raise ValueError("orjson is not installed")
+        return OrjsonSerializer()
+    raise ValueError(f"Unknown serializer: {name}")
+
+
+def sse_frame(payload: bytes, event_id: Optional[int] = None) -> bytes:
+    """Wrap an encoded event in an SSE frame, with an id line if given"""
+    if event_id is None:
+        return b"data: " + payload + b"\n\n"
+    return b"id: %d\ndata: %s\n\n" % (event_id, payload)
+
+
+# Constant frames, encoded once
+PING_FRAME = sse_frame(b'{"type":"ping"}')
+STREAM_END_FRAME = sse_frame(b'{"type":"stream_end","message":"Event stream ended"}')
@@ -0,0 +1,172 @@
+from typing import Annotated, Any, Callable, Dict, List, Optional, get_args, get_origin, get_type_hints
+import copy
+
+Reducer = Callable[[Any, Any], Any]
+
+
+def _pointer(key: str) -> str:
+    """JSON pointer (RFC 6901) for a top-level state key"""
+    return "/" + str(key).replace("~", "~0").replace("/", "~1")
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """Reference tokens of a JSON pointer, unescaped: "/a~1b/-" -> ["a/b", "-"]"""
+    if not pointer:
+        return []
+    if not pointer.startswith("/"):
+        raise ValueError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _same(a: Any, b: Any) -> bool:
+    """Identity first so unchanged values are never compared element by element"""
+    return a is b or a == b
+
+
+def state_reducers(schema: Any) -> Dict[str, Reducer]:
+    """
+    Reducers of a LangGraph state schema, from Annotated[type, reducer] keys.
+
+    Nodes return partial updates, and for these keys the graph state is
+    reducer(current, update) rather than the update itself.
+    """
+    reducers = {}
+    for key, hint in get_type_hints(schema, include_extras=True).items():
+        if get_origin(hint) is Annotated:
+            metadata = get_args(hint)[1:]
+            if metadata and callable(metadata[-1]):
+                reducers[key] = metadata[-1]
+    return reducers
+
+
+def reduce_update(before: Dict[str, Any], result: Dict[str, Any],
+                  reducers: Optional[Dict[str, Reducer]] = None) -> Dict[str, Any]:
+    """The values a node update leaves in the state, with channel reducers applied"""
+    if not reducers:
+        return result
+    return {
+        key: reducers[key](before[key], value) if key in reducers and key in before else value
+        for key, value in result.items()
+    }
+
+
+def _appended_items(before: Any, after: Any) -> Optional[List[Any]]:
+    """Items appended to a list, or None if after is not before plus a tail"""
+    if not isinstance(before, list) or not isinstance(after, list) or len(after) <= len(before):
+        return None
+    if all(_same(a, b) for a, b in zip(before, after)):
+        return after[len(before):]
+    return None
+
+
+def _diff_key(before: Dict[str, Any], key: str, value: Any) -> List[Dict[str, Any]]:
+    """Patch operations for one top-level key"""
+    path = _pointer(key)
+    if key not in before:
+        return [{"op": "add", "path": path, "value": value}]
+    old = before[key]
+    if _same(old, value):
+        return []
+    appended = _appended_items(old, value)
+    if appended is not None:
+        return [{"op": "add", "path": f"{path}/-", "value": item} for item in appended]
+    return [{"op": "replace", "path": path, "value": value}]
+
+
+def diff_state(before: Dict[str, Any], after: Dict[str, Any],
+               reducers: Optional[Dict[str, Reducer]] = None) -> List[Dict[str, Any]]:
+    """
+    JSON patch (RFC 6902) operations that turn before into after.
+
+    Only keys present in after are compared, because LangGraph nodes return
+    partial updates. Lists that only grew get one "add" per appended item
+    instead of re-sending the whole list.
+
+    before must not share mutable values with after: a node that appends to
+    a state list in place and returns it would otherwise compare equal to
+    itself. Copy the state before running the node.
+
+    Args:
+        before: State the client already has
+        after: Values returned by a node
+        reducers: Channel reducers (see state_reducers) applied to after first
+
+    Returns:
+        List of patch operations, empty if nothing changed
+    """
+    patch = []
+    for key, value in reduce_update(before, after, reducers).items():
+        patch.extend(_diff_key(before, key, value))
+    return patch
+
+
+class StateTracker:
+    """
+    Keeps the state a client has seen and turns node results into patches.
+
+    Node results are partial updates: keys with a reducer (see
+    state_reducers) are reduced into the tracked value, the way the graph
+    does, and the patch is computed against the reduced value. The tracked
+    state is a deep copy, because nodes may mutate state values in place
+    and return the same objects. Appends copy only the new items. Each key
+    carries a version that increases whenever the key changes. Every
+    snapshot_every patches a full snapshot is due so late joiners can sync.
+    """
+
+    def __init__(self, snapshot_every: int = 0):
+        """
+        Args:
+            snapshot_every: Emit a full snapshot after this many patches (0 disables)
+        """
+        self.snapshot_every = snapshot_every
+        self.state: Dict[str, Any] = {}
+        self.versions: Dict[str, int] = {}
+        self.patches_since_snapshot = 0
+
+    def reset(self, initial_state: Dict[str, Any]) -> Dict[str, Any]:
+        """Start tracking from an initial state and return its snapshot event"""
+        self.state = copy.deepcopy(dict(initial_state))
+        self.versions = {key: 0 for key in self.state}
+        return self.snapshot_event()
+
+    def snapshot_event(self) -> Dict[str, Any]:
+        """Full state with the current version of every key, restarting the snapshot countdown"""
+        self.patches_since_snapshot = 0
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Full state event without counting as the periodic snapshot"""
+        # Shallow copy: values stay shared, but later updates don't race the serializer
+        return {"type": "state_snapshot", "state": dict(self.state), "versions": dict(self.versions)}
+
+    def update(self, node_name: str, result: Dict[str, Any],
+               reducers: Optional[Dict[str, Reducer]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Apply a node result and return the patch event, or None if nothing changed.
+
+        Args:
+            node_name: Node that produced the result
+            result: Partial update returned by the node
+            reducers: Channel reducers of the graph's state schema
+        """
+        patch = []
+        changed = {}
+        for key, value in reduce_update(self.state, result, reducers).items():
+            ops = _diff_key(self.state, key, value)
+            if not ops:
+                continue
+            patch.extend(ops)
+            if ops[0]["path"] != _pointer(key):
+                # Only appended: copy the new items onto the list already held
+                self.state[key] = self.state[key] + copy.deepcopy([op["value"] for op in ops])
+            else:
+                self.state[key] = copy.deepcopy(value)
+            self.versions[key] = self.versions.get(key, 0) + 1
+            changed[key] = self.versions[key]
+        if not patch:
+            return None
+        self.patches_since_snapshot += 1
+        return {"type": "state_patch", "node_name": node_name, "patch": patch, "versions": changed}
+
+    def snapshot_due(self) -> bool:
+        return bool(self.snapshot_every) and self.patches_since_snapshot >= self.snapshot_every
@@ -1,18 +1,50 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import asyncio
-import concurrent.futures
 from event_emitter import event_emitter
-from graph import create_sample_graph
+from execution_pool import GraphExecutionPool, PoolFullError
+from graph import create_async_sample_graph, create_sample_graph
+from profiling import node_profiler
+from stream_policy import StreamPolicy
 
-app = FastAPI(title="Graph Event Streaming API", version="1.0.0")
+# Shared pool for all graph runs; size via GRAPH_POOL_SIZE / GRAPH_QUEUE_DEPTH
+graph_pool = GraphExecutionPool()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    graph_pool.shutdown()
+
+
+app = FastAPI(title="Graph Event Streaming API", version="1.0.0", lifespan=lifespan)
 
 class InitialState(BaseModel):
     message: str
 
+
+def sse_response(channel, request: Request, last_event_id: Optional[int] = None,
+                 heartbeat: Optional[float] = None) -> StreamingResponse:
+    policy = channel.policy
+    if heartbeat:
+        policy = StreamPolicy(heartbeat, policy.max_lag, policy.lag_strategy, policy.max_batch, policy.batch_events)
+    return StreamingResponse(
+        channel.get_events(last_event_id, policy, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Cache-Control, Last-Event-ID",
+            "X-Run-Id": channel.run_id
+        }
+    )
+
 @app.post("/stream-graph")
-async def stream_graph_execution(initial_state: InitialState):
+async def stream_graph_execution(initial_state: InitialState, request: Request,
+                                 heartbeat: Optional[float] = Query(None, ge=1, le=300)):
     """
     Stream graph execution events via Server-Sent Events.
     
@@ -22,6 +54,7 @@ async def stream_graph_execution(initial_state: InitialState):
     }
     
     The response will be a stream of SSE events showing state changes.
+    The optional heartbeat query parameter sets the seconds between pings.
     """
     try:
         # Convert Pydantic model to dict
@@ -30,38 +63,107 @@ async def stream_graph_execution(initial_state: InitialState):
         # Create the graph factory
         graph_factory = create_sample_graph()
         
-        # Run the graph in a separate thread to avoid blocking
-        loop = asyncio.get_event_loop()
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Schedule the graph execution using the event emitter's method
-            future = loop.run_in_executor(
-                executor, 
-                event_emitter.create_and_run_graph, 
-                state_dict, 
-                graph_factory
-            )
+        # Each request gets its own channel so concurrent streams don't share events
+        channel = event_emitter.open_channel()
+        
+        # Run the graph on the shared pool; returns immediately so streaming starts right away
+        try:
+            future = graph_pool.submit(channel.create_and_run_graph, state_dict, graph_factory)
+        except PoolFullError as e:
+            channel.close()
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+        
+        # If the client disconnects while the run is still queued, drop it from the pool
+        channel.add_close_callback(future.cancel)
         
         # Return streaming response
-        return StreamingResponse(
-            event_emitter.get_events(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Cache-Control"
-            }
-        )
+        return sse_response(channel, request, heartbeat=heartbeat)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error running graph: {str(e)}")
 
+@app.post("/stream-graph-async")
+async def stream_async_graph_execution(initial_state: InitialState, request: Request,
+                                       heartbeat: Optional[float] = Query(None, ge=1, le=300)):
+    """
+    Same as /stream-graph, for graphs with async nodes.
+
+    The graph runs with ainvoke as a task on the server's event loop, so
+    runs waiting on I/O don't hold a pool thread.
+    """
+    try:
+        state_dict = initial_state.model_dump()
+        graph_factory = create_async_sample_graph()
+        channel = event_emitter.open_channel()
+        
+        try:
+            task = graph_pool.submit_async(channel.create_and_run_graph_async, state_dict, graph_factory)
+        except PoolFullError as e:
+            channel.close()
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+        
+        # Cancelling the task stops the run at its current await, not only at node boundaries
+        channel.add_close_callback(task.cancel)
+        
+        return sse_response(channel, request, heartbeat=heartbeat)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running graph: {str(e)}")
+
+@app.get("/stream-graph/{run_id}")
+async def resume_graph_stream(run_id: str, request: Request,
+                              last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+                              heartbeat: Optional[float] = Query(None, ge=1, le=300)):
+    """
+    Reconnect to a running (or recently finished) graph run.
+
+    Send the id of the last event received in the Last-Event-ID header, as
+    EventSource does automatically, to get only the events after it. Without
+    the header the whole run is replayed. Replays are exempt from the
+    slow-consumer policy. Events older than the in-memory buffer are
+    replayed from disk when EVENT_LOG_DIR is set, and reported as
+    events_missed otherwise.
+    """
+    channel = event_emitter.get_channel(run_id)
+    if channel is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found or expired")
+    try:
+        cursor = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an integer")
+    return sse_response(channel, request, cursor, heartbeat)
+
+@app.get("/streams")
+async def get_streams():
+    """Open runs with the cursor, lag and delivery counters of each attached stream"""
+    return event_emitter.stream_stats()
+
+@app.get("/profiling")
+async def get_profiling():
+    """Per-node wall time, CPU time, allocation and state size histograms, hottest node first"""
+    return node_profiler.stats()
+
+@app.delete("/profiling")
+async def reset_profiling():
+    node_profiler.reset()
+    return {"status": "reset"}
+
 @app.get("/")
 async def root():
     return {
         "message": "Graph Event Streaming API", 
+        "active_runs": event_emitter.active_runs,
+        "pool": graph_pool.stats(),
         "endpoints": {
             "/stream-graph": "POST - Stream graph execution events",
+            "/stream-graph-async": "POST - Stream execution of a graph with async nodes",
+            "/stream-graph/{run_id}": "GET - Resume a stream (Last-Event-ID header)",
+            "/streams": "GET - Lag and delivery metrics of open streams",
+            "/profiling": "GET - Per-node profiling histograms (DELETE to reset)",
             "/docs": "GET - API documentation"
         }
     }
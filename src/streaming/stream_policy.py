@@ -0,0 +1,92 @@
+from typing import Any, Dict, Optional
+import os
+import time
+
+# Defaults, overridable through the environment
+DEFAULT_HEARTBEAT_INTERVAL = float(os.environ.get("SSE_HEARTBEAT_INTERVAL", "15"))
+DEFAULT_MAX_LAG = int(os.environ.get("SSE_MAX_LAG", "200"))
+DEFAULT_LAG_STRATEGY = os.environ.get("SSE_LAG_STRATEGY", "coalesce")
+DEFAULT_MAX_BATCH = int(os.environ.get("SSE_MAX_BATCH", "100"))
+BATCH_EVENTS = os.environ.get("SSE_BATCH_EVENTS", "1") == "1"
+
+LAG_STRATEGIES = ("drop_oldest", "coalesce")
+
+
+class StreamPolicy:
+    """
+    How an SSE stream keeps the connection alive and treats a slow client.
+
+    A stream that falls more than max_lag events behind the run's log is
+    brought back within bounds: "drop_oldest" skips the oldest unsent events
+    and reports how many, "coalesce" drops the unsent state events, keeps
+    lifecycle events, and sends one fresh state snapshot instead. The
+    replay a (re)connecting client asks for is exempt: the policy applies
+    once the stream has caught up with the events that existed when it
+    connected. Each write holds at most max_batch events, so memory per
+    stream stays bounded however far behind the client is.
+    """
+
+    def __init__(self, heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+                 max_lag: int = DEFAULT_MAX_LAG,
+                 lag_strategy: str = DEFAULT_LAG_STRATEGY,
+                 max_batch: int = DEFAULT_MAX_BATCH,
+                 batch_events: bool = BATCH_EVENTS):
+        """
+        Args:
+            heartbeat_interval: Seconds without events before a ping is sent
+            max_lag: Unsent events tolerated before the lag strategy applies (0 disables)
+            lag_strategy: "drop_oldest" or "coalesce"
+            max_batch: Most events sent in one write
+            batch_events: Send ready events in one write instead of one write per event
+
+        Raises:
+            ValueError: If lag_strategy is unknown
+        """
+        if lag_strategy not in LAG_STRATEGIES:
+            raise ValueError(f"Unknown lag strategy: {lag_strategy} (expected one of {LAG_STRATEGIES})")
+        self.heartbeat_interval = heartbeat_interval
+        self.max_lag = max_lag
+        self.lag_strategy = lag_strategy
+        self.max_batch = max_batch
+        self.batch_events = batch_events
+
+
+class StreamStats:
+    """Delivery and lag counters of one SSE stream"""
+
+    def __init__(self, stream_id: int, cursor: int):
+        self.stream_id = stream_id
+        self.connected_at = time.time()
+        self.cursor = cursor
+        self.events_sent = 0
+        self.bytes_sent = 0
+        self.pings = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.lag = 0
+        self.max_lag = 0
+        self._behind_since: Optional[float] = None
+
+    def observe_lag(self, lag: int):
+        self.lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag == 0:
+            self._behind_since = None
+        elif self._behind_since is None:
+            self._behind_since = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        behind = time.monotonic() - self._behind_since if self._behind_since is not None else 0.0
+        return {
+            "stream_id": self.stream_id,
+            "connected_seconds": round(time.time() - self.connected_at, 3),
+            "cursor": self.cursor,
+            "lag_events": self.lag,
+            "lag_seconds": round(behind, 3),
+            "max_lag_events": self.max_lag,
+            "events_sent": self.events_sent,
+            "bytes_sent": self.bytes_sent,
+            "pings": self.pings,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }